@@ -0,0 +1,192 @@
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+
+# Characters ignored when matching value-only entities against the transcript
+IGNORED_CHARS = frozenset(" ,.-")
+
+
+def normalize_value(value: str) -> str:
+    """Lowercase a value and drop separators so spoken and written forms compare equal."""
+    return "".join(ch for ch in value.lower() if ch not in IGNORED_CHARS)
+
+
+class AhoCorasick:
+    """Multi-pattern matcher that finds every pattern occurrence in one pass."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = nxt
+        self._output[node].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, text: Iterable[str]) -> List[Tuple[int, int, int]]:
+        """Return (start, end, pattern_index) for every match, ordered by end position."""
+        matches = []
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for index in self._output[node]:
+                matches.append((pos + 1 - len(self.patterns[index]), pos + 1, index))
+        return matches
+
+
+def word_separator(previous: str, text: str) -> str:
+    """Separator placed before `text` when joining words; mirrors clean_transcription's hyphen rules."""
+    if previous is None or previous.endswith("-") or text.startswith("-"):
+        return ""
+    return " "
+
+
+class WordAligner:
+    """Character-offset index over transcribed words.
+
+    Builds the cleaned transcript the detectors run on and remembers where each
+    word lives in it, so entity spans map straight back to word timestamps.
+    """
+
+    def __init__(self, transcription: List[Dict]):
+        self.words = transcription
+        self.starts = []
+        self.ends = []
+
+        pieces = []
+        pos = 0
+        previous = None
+        for word in transcription:
+            text = word['text']
+            separator = word_separator(previous, text)
+            pieces.append(separator)
+            pos += len(separator)
+            self.starts.append(pos)
+            pieces.append(text)
+            pos += len(text)
+            self.ends.append(pos)
+            previous = text
+        self.text = "".join(pieces)
+
+    def words_in_span(self, start: int, end: int) -> range:
+        """Indices of the words overlapping the character span [start, end)."""
+        first = bisect_right(self.ends, start)
+        last = bisect_left(self.starts, end)
+        return range(first, max(first, last))
+
+    def _value_matches(self, entities: List[Dict]) -> List[Tuple[int, int, Dict]]:
+        """Locate value-only entities in the transcript on whole-word boundaries."""
+        stream = []
+        owner = []
+        for index, word in enumerate(self.words):
+            for ch in normalize_value(word['text']):
+                stream.append(ch)
+                owner.append(index)
+
+        values = {}
+        for entity in entities:
+            values.setdefault(normalize_value(entity['word']), entity)
+        automaton = AhoCorasick(values)
+        found = [values[pattern] for pattern in automaton.patterns]
+
+        matches = []
+        for start, end, index in automaton.find_all(stream):
+            starts_word = start == 0 or owner[start - 1] != owner[start]
+            ends_word = end == len(owner) or owner[end] != owner[end - 1]
+            if starts_word and ends_word:
+                matches.append((owner[start], owner[end - 1] + 1, found[index]))
+        return matches
+
+    def entity_ranges(self, entities: List[Dict]) -> List[Tuple[int, int, Dict]]:
+        """Return (first_word, last_word_exclusive, entity) for every located entity."""
+        ranges = []
+        value_entities = []
+        for entity in entities:
+            if "start" in entity and "end" in entity:
+                covered = self.words_in_span(entity['start'], entity['end'])
+                if covered:
+                    ranges.append((covered.start, covered.stop, entity))
+            else:
+                value_entities.append(entity)
+        if value_entities:
+            ranges.extend(self._value_matches(value_entities))
+        return ranges
+
+    def _covered_fraction(self, index: int, entity: Dict) -> Tuple[float, float]:
+        """Share of word `index`'s spoken characters (letters and digits) before and up to the
+        end of an offset entity; (0, 1) when the entity covers the whole word or has no offsets."""
+        if "start" not in entity:
+            return 0.0, 1.0
+        text = self.words[index]['text']
+        spoken = sum(ch.isalnum() for ch in text)
+        if not spoken:
+            return 0.0, 1.0
+        cut_start = min(max(entity['start'] - self.starts[index], 0), len(text))
+        cut_end = min(max(entity['end'] - self.starts[index], 0), len(text))
+        before = sum(ch.isalnum() for ch in text[:cut_start])
+        upto = sum(ch.isalnum() for ch in text[:cut_end])
+        # Unspoken characters (punctuation) never shorten the segment
+        return before / spoken, (upto / spoken if upto < spoken else 1.0)
+
+    def segments_for(self, ranges: List[Tuple[int, int, Dict]]) -> List[Dict]:
+        """One redaction segment per covered word, in transcript order.
+
+        When an offset entity covers only part of a word ("card:4111"), the
+        segment covers the matching share of the word's duration.
+        """
+        # Longer spans claim their words first so labels are deterministic
+        covered = {}
+        for first, last, entity in sorted(ranges, key=lambda r: (r[0] - r[1], r[0])):
+            for index in range(first, last):
+                low, high = self._covered_fraction(index, entity)
+                if index in covered:
+                    label, old_low, old_high = covered[index]
+                    covered[index] = (label, min(low, old_low), max(high, old_high))
+                else:
+                    covered[index] = (entity['entity_type'], low, high)
+
+        segments = []
+        for index in sorted(covered):
+            label, low, high = covered[index]
+            start, end = self.words[index]['start'], self.words[index]['end']
+            segments.append({
+                "start": start + low * (end - start) if low else start,
+                "end": start + high * (end - start) if high < 1.0 else end,
+                "entity_type": label
+            })
+        return segments
+
+    def align(self, entities: List[Dict]) -> List[Dict]:
+        """Map entities to one redaction segment per covered word, in transcript order."""
+        return self.segments_for(self.entity_ranges(entities))
@@ -1,137 +1,299 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
 import os
+import json
+import time
+import random
+import cProfile
+import logging
 import tempfile
-import subprocess
-from llama_cpp import Llama
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
-from pii_detector import PIIDetector
+import threading
+from pii_detector import PIIDetector, DETECTOR_MODELS, SAMPLE_RATE, decode_audio
+from text_redaction import REDACTION_STYLES
+from model_registry import ModelRegistry
+from job_queue import LocalJobQueue, QueueFullError
+from live_redaction import LiveRedactionHub, SessionLimitError
+from metrics import REGISTRY, log_event
 from flask import send_file
 import uuid
 
 app = Flask(__name__)
 CORS(app)
+sock = Sock(app)
+
+# Structured JSON log lines; PII_LOG_LEVEL=DEBUG adds redacted transcripts
+logging.basicConfig(level=os.environ.get("PII_LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(name)s %(message)s")
+
+http_requests = REGISTRY.counter("pii_http_requests", "HTTP requests served.", ("endpoint", "method", "status"))
+http_seconds = REGISTRY.histogram("pii_http_request_seconds", "HTTP request latency.", ("endpoint",))
+pipeline_queue_depth = REGISTRY.gauge("pii_pipeline_queue_depth", "Payloads waiting per pipeline stage.", ("stage",))
+pipeline_utilization = REGISTRY.gauge("pii_pipeline_utilization", "Busy fraction of each pipeline stage.", ("stage",))
+cache_lookups = REGISTRY.gauge("pii_cache_lookups", "Result cache lookups since start.", ("result",))
+model_loaded = REGISTRY.gauge("pii_model_loaded", "Whether a model is resident (1) or not (0).", ("model",))
+jobs_pending = REGISTRY.gauge("pii_jobs_pending", "Background jobs queued or running.")
+
+# Optional profiling of sampled requests: with PII_PROFILE_DIR set, a fraction
+# (PII_PROFILE_SAMPLE_RATE) of requests runs under cProfile and those slower
+# than PII_PROFILE_SLOW_MS are dumped as .prof files (open with snakeviz or
+# pstats). Pipeline stages run on named threads ("transcribe-0", "detect-0",
+# ...), which py-spy can sample without this hook.
+profile_dir = os.environ.get("PII_PROFILE_DIR")
+profile_sample_rate = float(os.environ.get("PII_PROFILE_SAMPLE_RATE", "1.0"))
+profile_slow_ms = float(os.environ.get("PII_PROFILE_SLOW_MS", "1000"))
+profile_lock = threading.Lock()  # cProfile allows one active profiler at a time
+if profile_dir:
+    os.makedirs(profile_dir, exist_ok=True)
+
+# Every model is loaded once, through this registry. The idle LLM is evicted
+# after PII_LLM_IDLE_SECONDS or when the models exceed PII_MEMORY_BUDGET_MB.
+memory_budget_mb = os.environ.get("PII_MEMORY_BUDGET_MB")
+idle_seconds = os.environ.get("PII_LLM_IDLE_SECONDS")
+model_registry = ModelRegistry(
+    memory_budget=int(memory_budget_mb) * 1024 * 1024 if memory_budget_mb else None,
+    idle_timeout=float(idle_seconds) if idle_seconds else None
+)
 
-# Initialize PII detector with your model
-print("Loading models...")
-#tokenizer = AutoTokenizer.from_pretrained("AI-Enthusiast11/pii-entity-extractor")
-#model = AutoModelForTokenClassification.from_pretrained("AI-Enthusiast11/pii-entity-extractor")
-#nlp_pipeline = pipeline(
-#    "ner",
-#    model=model,
-#    tokenizer=tokenizer,
-#    aggregation_strategy="simple"
-#)
-
-# Initialize detector with pre-loaded pipeline
-#pii_detector = PIIDetector(nlp_pipeline=nlp_pipeline,whisper_model_size="medium",compute_type="int8",device="cpu")
- # Initialize models dictionary
-models = {
-    "deberta": None,
-    "unsloth": None
-}
-
-def load_deberta_model():
-    print("Loading DeBERTa model...")
-    tokenizer = AutoTokenizer.from_pretrained("AI-Enthusiast11/pii-entity-extractor")
-    model = AutoModelForTokenClassification.from_pretrained("AI-Enthusiast11/pii-entity-extractor")
-    return pipeline(
-        "ner",
-        model=model,
-        tokenizer=tokenizer,
-        aggregation_strategy="simple"
-    )
-
-def load_unsloth_model():
-    print("Loading Unsloth model...")
-    return Llama.from_pretrained(
-        repo_id="AI-Enthusiast11/mistral-7b-4bit-pii-entity-extractor",
-        filename="unsloth.Q4_K_M.gguf",
-    )
+# PII_MODEL_LOADING picks when models load: eager (before serving, the
+# default), background (a loader thread; /api/health answers at once and
+# reports readiness) or lazy (on the first request that needs each model).
+# PII_MODEL_DIR holds pre-downloaded models (download_models.py) and
+# PII_OFFLINE=1 rules out hub lookups.
+model_loading = os.environ.get("PII_MODEL_LOADING", "eager")
+if model_loading not in ("eager", "background", "lazy"):
+    raise ValueError(f"Unsupported PII_MODEL_LOADING: {model_loading}")
+
+# The result cache is opt-in: PII_CACHE_DIR enables it. It stores raw
+# transcripts (every word with its timestamps) and detected entities with
+# their unredacted values as plain JSON, so point it at storage that is as
+# protected as the uploads themselves. PII_CACHE_MAX_MB bounds its size.
+cache_dir = os.environ.get("PII_CACHE_DIR")
 
 # Initialize PII detector
 print("Initializing PII detector...")
 pii_detector = PIIDetector(
     whisper_model_size="medium",
     compute_type="int8",
-    device="cpu"
+    device="cpu",
+    cache_dir=cache_dir,
+    cache_max_bytes=int(os.environ.get("PII_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+    registry=model_registry,
+    detection_mode=os.environ.get("PII_DETECTION_MODE", "model"),
+    llm_contexts=int(os.environ.get("PII_LLM_CONTEXTS", "1")),
+    ner_backend=os.environ.get("PII_NER_BACKEND", "torch"),
+    onnx_dir=os.environ.get("PII_ONNX_DIR"),
+    model_dir=os.environ.get("PII_MODEL_DIR"),
+    offline=os.environ.get("PII_OFFLINE", "0") == "1",
+    preload=model_loading == "eager",
+    # Concurrent Whisper / DeBERTa calls; the cores are split across the models, then across their slots
+    whisper_slots=int(os.environ.get("PII_WHISPER_SLOTS", "1")),
+    ner_slots=int(os.environ.get("PII_NER_SLOTS", "1")),
+    # Mute intervals: PII_PADDING is seconds or a JSON {"ENTITY-TYPE": seconds, "default": seconds} map
+    padding=json.loads(os.environ.get("PII_PADDING", "0.1")),
+    bridge_gap=float(os.environ.get("PII_BRIDGE_GAP", "0.0")),
+    snap_boundaries=os.environ.get("PII_SNAP_BOUNDARIES", "0") == "1",
+    # Files of at least PII_LONG_FILE_SECONDS are split at pauses and transcribed
+    # in parallel over the Whisper slots (0 keeps single-pass transcription)
+    long_file_seconds=float(os.environ.get("PII_LONG_FILE_SECONDS", "0"))
 )
 
-def get_model(model_name):
-    """Get or load the requested model"""
-    if model_name not in models:
-        raise ValueError(f"Unknown model: {model_name}")
-    
-    if models[model_name] is None:
-        if model_name == "deberta":
-            models[model_name] = load_deberta_model()
-        elif model_name == "unsloth":
-            models[model_name] = load_unsloth_model()
-    
-    return models[model_name]  
-
-def convert_audio_to_wav(audio_file):
-    """Convert uploaded audio to WAV format using ffmpeg."""
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav, \
-         tempfile.NamedTemporaryFile(delete=False) as temp_input:
-
-        audio_file.save(temp_input.name)
-
-        command = [
-            "ffmpeg", "-y",
-            "-i", temp_input.name,
-            "-ar", "16000",
-            "-ac", "1",
-            temp_wav.name
-        ]
-        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-        return temp_wav.name
+warmup_models = os.environ.get("PII_WARMUP_MODELS")
+warmup_models = [m.strip() for m in warmup_models.split(",")] if warmup_models else None
+if model_loading == "background":
+    pii_detector.load_in_background(warmup_models)
+# Optional eager warm-up: load the models and run a dummy inference before serving
+elif model_loading == "eager" and os.environ.get("PII_WARMUP", "0") == "1":
+    print("Warming up models...")
+    pii_detector.warm_up(warmup_models)
+
+# Shared staged pipeline: uploads from all requests overlap across the
+# transcription, detection and redaction stages
+redaction_pipeline = pii_detector.build_pipeline(
+    transcribe_workers=pii_detector.whisper_slots,
+    detect_workers=pii_detector.ner_slots
+)
 
-@app.route('/api/detect-pii', methods=['POST'])
-def detect_pii():
-    try:
-        model_name = request.form.get('model', 'deberta').lower()
-        files = request.files.getlist('audio')
-        if not files:
-            return jsonify({'error': 'No audio files provided'}), 400
+# PII_STREAMING=1 redacts each upload as one generator chain instead
+# (detect_and_redact_audio_streaming): transcription, windowed detection and
+# audio writing overlap within the file, so long recordings are written while
+# Whisper is still decoding them
+streaming_redaction = os.environ.get("PII_STREAMING", "0") == "1"
 
-        results = []
+# Background jobs for /api/jobs; swap in another JobQueue backend here
+job_queue = LocalJobQueue(
+    workers=int(os.environ.get("PII_JOB_WORKERS", "2")),
+    max_pending=int(os.environ.get("PII_JOB_QUEUE_SIZE", "16"))
+)
 
-        for audio_file in files:
-            if not audio_file.filename:
-                continue
-            # Load the requested model
-            model = get_model(model_name)
-            pii_detector.set_model(model_name)  # Update detector with current model
-    
-            print(f"Processing audio file: {audio_file.filename}")
-            wav_path = convert_audio_to_wav(audio_file)
-            print("Audio converted to WAV format")
-
-            # Use the PIIDetector's transcription and detection methods
-            result = pii_detector.detect_and_redact_audio(wav_path)
-            os.unlink(wav_path)
-
-            # Generate download URL for the redacted audio
-            redacted_filename = f"redacted_{uuid.uuid4().hex}.wav"
-            redacted_path = os.path.join(tempfile.gettempdir(), redacted_filename)
-            os.rename(result['redacted_audio_path'], redacted_path)
+# Live sessions share the detector's models; Whisper/detector calls are
+# bounded across sessions rather than per session
+live_hub = LiveRedactionHub(
+    pii_detector,
+    max_sessions=int(os.environ.get("PII_LIVE_MAX_SESSIONS", "16")),
+    transcribe_slots=int(os.environ.get("PII_LIVE_TRANSCRIBE_SLOTS", "2"))
+)
+
+# Bulk text redaction: documents per request, and the key that keeps "hash"
+# placeholders stable across requests and restarts (random per process if unset)
+text_batch_limit = int(os.environ.get("PII_TEXT_BATCH_LIMIT", "1000"))
+hash_key = os.environ["PII_HASH_KEY"].encode("utf-8") if os.environ.get("PII_HASH_KEY") else os.urandom(32)
 
+def decode_upload(audio_file):
+    """Decode an uploaded file to a 16 kHz mono float32 buffer, without touching disk."""
+    return decode_audio(audio_file.read())
+
+def decode_uploads(files):
+    """Decode every named upload, returning the uploads and their audio buffers."""
+    uploads = []
+    buffers = []
+    for audio_file in files:
+        if not audio_file.filename:
+            continue
+        buffers.append(decode_upload(audio_file))
+        uploads.append(audio_file)
+        log_event("upload_decoded", file=audio_file.filename,
+                  audio_seconds=round(len(buffers[-1]) / SAMPLE_RATE, 3))
+    return uploads, buffers
+
+def log_request_error(e):
+    """One structured line for a failed request; the request's content is never logged."""
+    log_event("request_failed", level=logging.ERROR, endpoint=request.url_rule.rule if request.url_rule else None,
+              error=f"{type(e).__name__}: {e}")
+
+def read_uploads(files):
+    """Read every named upload into memory, returning (filename, bytes) pairs for a background job."""
+    return [(audio_file.filename, audio_file.read()) for audio_file in files if audio_file.filename]
+
+def download_path():
+    """Fresh path in the download folder; redacted audio is encoded straight into it."""
+    return os.path.join(tempfile.gettempdir(), f"redacted_{uuid.uuid4().hex}.wav")
+
+def run_redaction_pipeline(filenames, buffers, model_type=None, on_file_done=None):
+    """Run decoded uploads through the shared pipeline, writing each redacted file once.
+
+    The model travels with each payload, so concurrent requests for different
+    models never affect each other (None uses the detector's default).
+    """
+    payloads = [{"audio": buffer, "name": filename, "output_path": download_path(), "model_type": model_type}
+                for filename, buffer in zip(filenames, buffers)]
+    # Wait for every file before raising, so no stage is still writing an output we remove
+    outcomes = []
+    for outcome in (redact_streaming(payloads) if streaming_redaction else redaction_pipeline.map(payloads)):
+        outcomes.append(outcome)
+        if on_file_done:
+            on_file_done(len(outcomes))
+    for _, _, error in outcomes:
+        if error:
+            for payload in payloads:
+                if os.path.exists(payload["output_path"]):
+                    os.unlink(payload["output_path"])
+            raise error
+    return [result for _, result, _ in outcomes]
+
+def redact_streaming(payloads):
+    """(payload, result, error) per payload, like redaction_pipeline.map, through the streaming path."""
+    for payload in payloads:
+        try:
+            result = pii_detector.detect_and_redact_audio_streaming(
+                payload["audio"], payload["output_path"], model_type=payload["model_type"])
+            yield payload, result, None
+        except Exception as e:
+            yield payload, None, e
+
+def format_results(kind, filenames, batch_results):
+    """Build the per-file response entries of /api/detect-pii ("detect") or /api/redact-audio ("redact")."""
+    results = []
+    for filename, result in zip(filenames, batch_results):
+        redacted_filename = os.path.basename(result['redacted_audio_path'])
+
+        if kind == "detect":
             results.append({
-                'filename': audio_file.filename,
+                'filename': filename,
                 'transcript': result['transcription'],
                 'redacted_transcript': pii_detector.redact_text(
                     result['transcription'],
                     result['pii_entities']
                 ),
                 'entities': result['pii_entities'],
+                'redacted_intervals': result['redacted_intervals'],
+                'redacted_audio_url': f"/api/download/{redacted_filename}"
+            })
+        else:
+            results.append({
+                'original_filename': filename,
+                'transcript': result['transcription'],
+                'entities': result['pii_entities'],
+                'redacted_intervals': result['redacted_intervals'],
                 'redacted_audio_url': f"/api/download/{redacted_filename}"
             })
+    return results
+
+def run_audio_job(progress, kind, model_name, uploads):
+    """Background job: decode the uploads, run the pipeline and publish the results."""
+    total = len(uploads)
+    filenames = [filename for filename, _ in uploads]
+    buffers = []
+    for n, (filename, data) in enumerate(uploads):
+        progress("converting", 0.1 * n / total)
+        buffers.append(decode_audio(data))
+    # The encoded uploads are no longer needed once decoded
+    uploads.clear()
+
+    progress("processing", 0.1)
+    batch_results = run_redaction_pipeline(
+        filenames, buffers,
+        model_type=model_name if kind == "detect" else None,
+        on_file_done=lambda done: progress("processing", 0.1 + 0.9 * done / total)
+    )
+    return {'results': format_results(kind, filenames, batch_results)}
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profiler = None
+    if profile_dir and random.random() < profile_sample_rate and profile_lock.acquire(blocking=False):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    http_requests.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    http_seconds.observe(elapsed, endpoint=endpoint)
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        profile_lock.release()
+        if elapsed * 1000 >= profile_slow_ms:
+            profile_path = os.path.join(profile_dir, f"{int(time.time() * 1000)}_{request.endpoint}.prof")
+            profiler.dump_stats(profile_path)
+            log_event("slow_request_profiled", endpoint=endpoint, seconds=round(elapsed, 3), profile=profile_path)
+    return response
 
+@app.route('/api/detect-pii', methods=['POST'])
+def detect_pii():
+    try:
+        model_name = request.form.get('model', 'deberta').lower()
+        if model_name not in DETECTOR_MODELS:
+            return jsonify({'error': f"Unknown model: {model_name}"}), 400
+        files = request.files.getlist('audio')
+        if not files:
+            return jsonify({'error': 'No audio files provided'}), 400
+
+        uploads, buffers = decode_uploads(files)
+        filenames = [audio_file.filename for audio_file in uploads]
+        # Transcription of later files overlaps detection and redaction of earlier ones;
+        # the requested model is passed along rather than switched on the shared detector
+        batch_results = run_redaction_pipeline(filenames, buffers, model_type=model_name)
+
+        results = format_results("detect", filenames, batch_results)
         return jsonify({'results': results})
 
     except Exception as e:
-        print(f"Error processing request: {str(e)}")
+        log_request_error(e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/transcribe', methods=['POST'])
@@ -144,27 +306,30 @@ def transcribe_audio():
         if not audio_file.filename:
             return jsonify({'error': 'No selected file'}), 400
 
-        print(f"Processing audio file: {audio_file.filename}")
-        wav_path = convert_audio_to_wav(audio_file)
-        print("Audio converted to WAV format")
+        audio = decode_upload(audio_file)
+        log_event("upload_decoded", file=audio_file.filename, audio_seconds=round(len(audio) / SAMPLE_RATE, 3))
 
-        try:
-            # Use the PIIDetector's transcription method
-            transcription = pii_detector.transcribe_audio(wav_path)
-            transcript = " ".join([w['text'] for w in transcription])
-            
-            os.unlink(wav_path)
-            return jsonify({'transcript': transcript})
+        # Use the PIIDetector's transcription method
+        transcription = pii_detector.transcribe_audio(audio)
+        transcript = " ".join([w['text'] for w in transcription])
 
-        except Exception as e:
-            if os.path.exists(wav_path):
-                os.unlink(wav_path)
-            raise e
+        return jsonify({'transcript': transcript})
 
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log_request_error(e)
         return jsonify({'error': str(e)}), 500
 
+def is_entity(entity):
+    """A string entity_type plus integer start/end offsets, or else a string word (see TextRedactor.spans)."""
+    if not isinstance(entity, dict) or not isinstance(entity.get('entity_type'), str):
+        return False
+    if 'start' in entity and 'end' in entity:
+        return all(type(entity[key]) is int for key in ('start', 'end'))
+    return isinstance(entity.get('word'), str)
+
+def is_entity_list(entities):
+    return isinstance(entities, list) and all(is_entity(entity) for entity in entities)
+
 @app.route('/api/redact', methods=['POST'])
 def redact_text():
     try:
@@ -174,14 +339,55 @@ def redact_text():
 
         text = data['text']
         entities = data['entities']
-        redacted_text = pii_detector.redact_text(text, entities)
+        style = data.get('style', 'tag')
+        if not isinstance(text, str) or not is_entity_list(entities):
+            return jsonify({'error': 'text must be a string and entities a list; each entity needs a string entity_type and integer start/end or a string word'}), 400
+        if style not in REDACTION_STYLES:
+            return jsonify({'error': f"Unknown style: {style}"}), 400
+        redacted_text = pii_detector.redact_text(text, entities, style=style, hash_key=hash_key)
 
         return jsonify({
             'redacted_text': redacted_text
         })
 
     except Exception as e:
-        print(f"Error processing redaction request: {str(e)}")
+        log_request_error(e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/redact-texts', methods=['POST'])
+def redact_texts():
+    """Bulk text redaction: {"texts": [...], "entities": [[...], ...] (optional; detected if
+    omitted), "style": "mask" | "tag" | "pseudonym" | "hash", "model": "deberta" | "unsloth"}."""
+    try:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('texts'), list):
+            return jsonify({'error': 'Missing texts in request'}), 400
+
+        texts = data['texts']
+        entities = data.get('entities')
+        style = data.get('style', 'tag')
+        model_name = data.get('model', 'deberta')
+        if len(texts) > text_batch_limit:
+            return jsonify({'error': f"At most {text_batch_limit} texts per request"}), 400
+        if not all(isinstance(text, str) for text in texts):
+            return jsonify({'error': 'Every text must be a string'}), 400
+        if entities is not None and not (isinstance(entities, list) and len(entities) == len(texts)
+                                         and all(is_entity_list(text_entities) for text_entities in entities)):
+            return jsonify({'error': 'entities must hold one list per text; each entity needs a string entity_type and integer start/end or a string word'}), 400
+        if not isinstance(model_name, str):
+            return jsonify({'error': 'model must be a string'}), 400
+        model_name = model_name.lower()
+        if style not in REDACTION_STYLES:
+            return jsonify({'error': f"Unknown style: {style}"}), 400
+        if model_name not in DETECTOR_MODELS:
+            return jsonify({'error': f"Unknown model: {model_name}"}), 400
+
+        results = pii_detector.redact_texts(texts, entities, style=style, model_type=model_name,
+                                            hash_key=hash_key)
+        return jsonify({'results': results})
+
+    except Exception as e:
+        log_request_error(e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/redact-audio', methods=['POST'])
@@ -191,37 +397,54 @@ def redact_audio_endpoint():
         if not files:
             return jsonify({'error': 'No audio files provided'}), 400
 
-        results = []
+        uploads, buffers = decode_uploads(files)
+        filenames = [audio_file.filename for audio_file in uploads]
+        # Use the PIIDetector's complete audio redaction pipeline, staged across files
+        batch_results = run_redaction_pipeline(filenames, buffers)
 
-        for audio_file in files:
-            if not audio_file.filename:
-                continue
+        results = format_results("redact", filenames, batch_results)
+        return jsonify({'results': results})
 
-            print(f"Processing audio file: {audio_file.filename}")
-            wav_path = convert_audio_to_wav(audio_file)
+    except Exception as e:
+        log_request_error(e)
+        return jsonify({'error': str(e)}), 500
 
-            # Use the PIIDetector's complete audio redaction pipeline
-            result = pii_detector.detect_and_redact_audio(wav_path)
-            os.unlink(wav_path)
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue uploads for background detection ("detect") or redaction ("redact")."""
+    try:
+        kind = request.form.get('kind', 'detect').lower()
+        model_name = request.form.get('model', 'deberta').lower()
+        if kind not in ('detect', 'redact'):
+            return jsonify({'error': f"Unknown job kind: {kind}"}), 400
+        if model_name not in DETECTOR_MODELS:
+            return jsonify({'error': f"Unknown model: {model_name}"}), 400
 
-            # Generate download URL for the redacted audio
-            redacted_filename = f"redacted_{uuid.uuid4().hex}.wav"
-            redacted_path = os.path.join(tempfile.gettempdir(), redacted_filename)
-            os.rename(result['redacted_audio_path'], redacted_path)
+        files = request.files.getlist('audio')
+        uploads = read_uploads(files)
+        if not uploads:
+            return jsonify({'error': 'No audio files provided'}), 400
 
-            results.append({
-                'original_filename': audio_file.filename,
-                'transcript': " ".join([w['text'] for w in result['transcription']]),
-                'entities': result['pii_entities'],
-                'redacted_audio_url': f"/api/download/{redacted_filename}"
-            })
+        try:
+            job_id = job_queue.submit(run_audio_job, kind, model_name, uploads)
+        except QueueFullError as e:
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '30'
+            return response, 429
 
-        return jsonify({'results': results})
+        return jsonify({'job_id': job_id, 'status_url': f"/api/jobs/{job_id}"}), 202
 
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log_request_error(e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
 @app.route('/api/download/<filename>', methods=['GET'])
 def download_file(filename):
     filepath = os.path.join(tempfile.gettempdir(), filename)
@@ -233,8 +456,92 @@ def download_file(filename):
 def health_check():
     return jsonify({
         'status': 'healthy',
-        'pii_detector_loaded': pii_detector is not None
+        'pii_detector_loaded': pii_detector is not None,
+        'ready': pii_detector.is_ready(),
+        'model_loading': model_loading,
+        'model_load_error': pii_detector.load_error,
+        'pipeline': redaction_pipeline.stats(),
+        'cache': pii_detector.cache.stats() if pii_detector.cache else None,
+        'jobs': job_queue.stats(),
+        'models': model_registry.stats(),
+        'live_sessions': live_hub.stats()
     })
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until the required models are loaded.
+
+    In lazy mode the models load on the first request that needs them, which
+    a probe gating traffic would never let through, so the instance is ready
+    as soon as it serves.
+    """
+    loaded = pii_detector.is_ready()
+    ready = loaded or model_loading == "lazy"
+    return jsonify({'ready': ready, 'models_loaded': loaded, 'models': pii_detector.required_models()}), \
+        200 if ready else 503
+
+@sock.route('/api/stream')
+def stream_redaction(ws):
+    """Live redaction over a WebSocket.
+
+    Query parameters: sample_rate (default 16000), format (s16le or f32le),
+    lookahead, step and max_hold (seconds), fill (silence or beep). The client sends mono
+    PCM as binary messages and {"type": "end"} when done. The server sends back
+    redacted PCM in the same format as binary messages, plus JSON events:
+    "ready", "entity" (once confirmed), "done" and "error".
+    """
+    try:
+        session = live_hub.open_session(
+            sample_rate=int(request.args.get('sample_rate', 16000)),
+            sample_format=request.args.get('format', 's16le'),
+            lookahead=float(request.args.get('lookahead', 1.5)),
+            step=float(request.args.get('step', 0.5)),
+            max_hold=float(request.args.get('max_hold', 8.0)),
+            fill=request.args.get('fill', 'silence')
+        )
+    except (ValueError, SessionLimitError) as e:
+        ws.send(json.dumps({'type': 'error', 'error': str(e)}))
+        return
+
+    def send(events):
+        for event in events:
+            ws.send(event if isinstance(event, bytes) else json.dumps(event))
+
+    try:
+        ws.send(json.dumps(dict(session.config(), type='ready')))
+        while True:
+            message = ws.receive()
+            if isinstance(message, str):
+                if json.loads(message).get('type') == 'end':
+                    break
+                continue
+            send(session.feed(message))
+        send(session.finish())
+    except ConnectionClosed:
+        pass
+    except Exception as e:
+        log_event("live_session_failed", level=logging.ERROR, error=f"{type(e).__name__}: {e}")
+        try:
+            ws.send(json.dumps({'type': 'error', 'error': str(e)}))
+        except ConnectionClosed:
+            pass
+    finally:
+        live_hub.close_session(session)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text-format metrics: stage timings, counters and current pipeline/model state."""
+    for stage, stats in redaction_pipeline.stats().items():
+        pipeline_queue_depth.set(stats['queue_depth'], stage=stage)
+        pipeline_utilization.set(stats['utilization'], stage=stage)
+    if pii_detector.cache:
+        cache_stats = pii_detector.cache.stats()
+        cache_lookups.set(cache_stats['hits'], result="hit")
+        cache_lookups.set(cache_stats['misses'], result="miss")
+    for name, stats in model_registry.stats().items():
+        model_loaded.set(1 if stats['loaded'] else 0, model=name)
+    jobs_pending.set(job_queue.stats()['pending'])
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,392 @@
+"""Multi-process batch redaction, and the bulk CLI for offline corpora:
+
+    python batch_processing.py recordings/ --output-dir redacted/ --workers 8 --shard 0/4
+
+Inputs are a directory (searched recursively), a glob pattern or a JSONL
+manifest, in any format ffmpeg reads. Results stream to a JSONL file as files
+finish, files whose redacted output already exists are skipped, and
+`--shard i/N` gives each machine a stable share of the corpus.
+"""
+import os
+import sys
+import glob
+import json
+import zlib
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+
+# Detector owned by the current worker process, built once by _init_worker
+_worker_detector = None
+
+# Files picked up when a directory or glob is given (anything ffmpeg decodes works in a manifest)
+AUDIO_EXTENSIONS = frozenset(".wav .flac .mp3 .m4a .aac .ogg .oga .opus .wma .webm .mp4 .aiff .aif .amr .caf".split())
+
+
+def _init_worker(detector_config: Dict, cpu_threads: int):
+    """Load the models once per worker process and warm them up."""
+    global _worker_detector
+    from pii_detector import PIIDetector
+
+    config = dict(detector_config, cpu_threads=cpu_threads)
+    _worker_detector = PIIDetector(**config)
+    _worker_detector.warm_up()
+
+
+def _redact_in_worker(input_path: str, output_path: str) -> Dict:
+    """Run the full pipeline on one file; errors are returned instead of raised."""
+    try:
+        result = _worker_detector.detect_and_redact_audio(input_path, output_path)
+        return dict(result, input_path=input_path)
+    except Exception as e:
+        return {"input_path": input_path, "error": f"{type(e).__name__}: {e}"}
+
+
+def _readable_by_soundfile(path: str) -> bool:
+    import soundfile as sf
+    try:
+        sf.info(path)
+        return True
+    except RuntimeError:
+        return False
+
+
+def _bulk_redact_in_worker(input_path: str, output_path: str, include_transcript: bool,
+                           streaming: bool = False) -> Dict:
+    """Redact one file of a bulk run into `output_path`, returning its JSONL record.
+
+    Formats libsndfile cannot read are decoded with ffmpeg first. The output
+    is written under a temporary name and renamed when complete, so a file
+    cut short by a crash is never mistaken for a finished one. With
+    `streaming` the file goes through detect_and_redact_audio_streaming.
+    """
+    from pii_detector import decode_audio, entity_type_counts
+
+    output = Path(output_path)
+    partial = str(output.with_name(f".{output.stem}.partial{output.suffix}"))
+    try:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        audio = input_path if _readable_by_soundfile(input_path) else decode_audio(input_path)
+        if streaming:
+            result = _worker_detector.detect_and_redact_audio_streaming(audio, partial)
+        else:
+            result = _worker_detector.detect_and_redact_audio(audio, partial)
+        os.replace(partial, output_path)
+        record = {
+            "input_path": input_path,
+            "output_path": output_path,
+            "entities": entity_type_counts(result['pii_entities']),
+            "redacted_intervals": result['redacted_intervals'],
+            "redacted_transcript": _worker_detector.redact_text(result['transcription'], result['pii_entities'])
+        }
+        if include_transcript:
+            record.update(transcription=result['transcription'], pii_entities=result['pii_entities'])
+        return record
+    except Exception as e:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        return {"input_path": input_path, "output_path": output_path, "error": f"{type(e).__name__}: {e}"}
+
+
+def load_manifest(manifest_path: str) -> Dict[str, Dict]:
+    """Read a run manifest; the last record written for an input wins."""
+    records = {}
+    if not os.path.exists(manifest_path):
+        return records
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run
+                continue
+            records[record["input_path"]] = record
+    return records
+
+
+def _pool_map(worker: Callable, tasks: Iterable[Tuple], detector_config: Dict, workers: int,
+              cpu_threads: int, extra_args: Tuple = ()) -> Iterator[Tuple[Tuple, Dict]]:
+    """Run `worker(*task, *extra_args)` for every (input path, output path) task on a
+    process pool, yielding (task, record) as files finish.
+
+    At most two tasks per worker are in flight, so `tasks` may be a lazy
+    iterator of any length. A worker process that dies (a native crash or the
+    OOM killer) breaks the whole pool; the pool is then rebuilt and the files
+    that were in flight are retried one at a time, so only the file that kills
+    a worker on its own gets an error record and the run carries on.
+    """
+    # Spawned workers start clean instead of inheriting forked model/thread state
+    context = multiprocessing.get_context("spawn")
+
+    def new_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                   initargs=(detector_config, cpu_threads))
+
+    tasks = iter(tasks)
+    suspects = deque()
+    in_flight = {}
+    exhausted = False
+    executor = new_pool()
+    try:
+        while True:
+            if suspects:
+                # Isolate: one suspect at a time, on its own in the pool
+                if not in_flight:
+                    task = suspects.popleft()
+                    in_flight[executor.submit(worker, *task, *extra_args)] = (task, True)
+            else:
+                while not exhausted and len(in_flight) < 2 * workers:
+                    task = next(tasks, None)
+                    if task is None:
+                        exhausted = True
+                    else:
+                        in_flight[executor.submit(worker, *task, *extra_args)] = (task, False)
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in finished:
+                task, alone = in_flight.pop(future)
+                try:
+                    record = future.result()
+                except BrokenProcessPool as e:
+                    broken = True
+                    if not alone:
+                        suspects.append(task)
+                        continue
+                    record = {"input_path": task[0], "output_path": task[1],
+                              "error": f"BrokenProcessPool: worker process died ({e})"}
+                yield task, record
+
+            if broken:
+                suspects.extend(task for task, _ in in_flight.values())
+                in_flight.clear()
+                if suspects:
+                    print(f"Worker process died; retrying {len(suspects)} file(s) one at a time", file=sys.stderr)
+                executor.shutdown(wait=True)
+                executor = new_pool()
+    finally:
+        executor.shutdown(wait=True)
+
+
+def parallel_redact(audio_files: Iterable[Union[str, Path]], output_folder: str,
+                    detector_config: Dict, workers: int = None, ordered: bool = True,
+                    manifest_path: str = None) -> Iterator[Dict]:
+    """Redact many files on a pool of worker processes, each with its own warm models.
+
+    Args:
+        audio_files: Input audio paths
+        output_folder: Folder the redacted files are written to (same file names)
+        detector_config: PIIDetector constructor arguments (see PIIDetector.config)
+        workers: Number of worker processes (defaults to the CPU count)
+        ordered: Yield results in input order instead of as they complete
+        manifest_path: JSONL file recording finished files; files already recorded
+            as successful are not processed again, so an interrupted run resumes
+
+    Yields the same result dicts as detect_and_redact_audio plus `input_path`, or
+    {"input_path", "error"} for a file that failed, including one whose worker
+    process died (see _pool_map).
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    # Each worker's models run one after another, so every one of them gets the worker's share
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    done = load_manifest(manifest_path) if manifest_path else {}
+    pending = []
+    for audio_file in audio_files:
+        input_path = str(audio_file)
+        record = done.get(input_path)
+        if record and "error" not in record:
+            yield record
+        else:
+            pending.append((input_path, str(Path(output_folder) / Path(input_path).name)))
+
+    if not pending:
+        return
+
+    manifest = open(manifest_path, "a", encoding="utf-8") if manifest_path else None
+    position = {task: n for n, task in enumerate(pending)}
+    finished = {}
+    next_index = 0
+    try:
+        for task, result in _pool_map(_redact_in_worker, pending, detector_config,
+                                      min(workers, len(pending)), cpu_threads):
+            if "error" in result:
+                print(f"Failed: {result['input_path']} ({result['error']})")
+            else:
+                print(f"Redacted file saved to: {result['redacted_audio_path']}")
+            if manifest:
+                manifest.write(json.dumps(result) + "\n")
+                manifest.flush()
+            if not ordered:
+                yield result
+                continue
+            finished[position[task]] = result
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+    finally:
+        if manifest:
+            manifest.close()
+
+
+def _relative_name(path: str) -> str:
+    """`path` without its root and without ".." parts, safe to join under an output folder."""
+    parts = Path(os.path.normpath(path)).parts
+    return str(Path(*[part for part in parts if part not in ("..", Path(path).anchor)]))
+
+
+def iter_inputs(source: str, exclude: str = None) -> Iterator[Tuple[str, str, str]]:
+    """(input path, relative name, explicit output path or None) for every input in `source`.
+
+    `source` is a directory (searched recursively, skipping the `exclude`
+    folder), a glob pattern, or a JSONL manifest whose lines hold "input_path"
+    and optionally "output_path". Inputs are yielded lazily, so corpora of any
+    size are never listed in memory. The relative name decides the shard and
+    the output path.
+    """
+    if os.path.isdir(source):
+        exclude = os.path.abspath(exclude) if exclude else None
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != exclude)
+            for name in sorted(files):
+                if Path(name).suffix.lower() in AUDIO_EXTENSIONS:
+                    path = os.path.join(root, name)
+                    yield path, os.path.relpath(path, source), None
+    elif source.endswith(".jsonl") and os.path.isfile(source):
+        with open(source, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry["input_path"], _relative_name(entry["input_path"]), entry.get("output_path")
+    else:
+        # Names are kept relative to the part of the pattern before the first wildcard
+        base = source[:min((source.find(ch) for ch in "*?[" if ch in source), default=len(source))]
+        base = os.path.dirname(base)
+        for path in glob.iglob(source, recursive=True):
+            if os.path.isfile(path) and Path(path).suffix.lower() in AUDIO_EXTENSIONS:
+                yield path, os.path.relpath(path, base or "."), None
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """"i/N" -> (i, N), with shards numbered 0 to N-1."""
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {shard!r}")
+    if not 0 <= index < count:
+        raise ValueError(f"Shard index must be between 0 and {count - 1}, got {index}")
+    return index, count
+
+
+def in_shard(name: str, shard: Tuple[int, int]) -> bool:
+    """Stable assignment of an input to a shard, independent of listing order and corpus size."""
+    index, count = shard
+    return zlib.crc32(name.encode("utf-8")) % count == index
+
+
+def output_path_for(name: str, output_folder: str) -> str:
+    """Mirror the input's relative path; formats libsndfile cannot write become WAV."""
+    import soundfile as sf
+    path = Path(output_folder) / name
+    if path.suffix.lstrip(".").upper() not in sf.available_formats():
+        path = path.with_suffix(".wav")
+    return str(path)
+
+
+def bulk_redact(tasks: Iterable[Tuple[str, str]], detector_config: Dict, results_path: str,
+                workers: int = None, include_transcript: bool = False,
+                streaming: bool = False) -> Dict[str, int]:
+    """Redact (input, output) pairs on a process pool, appending one JSONL record per file.
+
+    At most two files per worker are in flight, and records are written as
+    files finish, so memory stays flat however many files `tasks` yields. A
+    file that kills its worker process gets an error record and the pool is
+    rebuilt (see _pool_map). Returns counts of redacted and failed files.
+    """
+    workers = workers or os.cpu_count() or 1
+    # Each worker's models run one after another, so every one of them gets the worker's share
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+    counts = {"redacted": 0, "failed": 0}
+    with open(results_path, "a", encoding="utf-8") as results:
+        for _, record in _pool_map(_bulk_redact_in_worker, tasks, detector_config, workers, cpu_threads,
+                                   extra_args=(include_transcript, streaming)):
+            if "error" in record:
+                counts["failed"] += 1
+                print(f"Failed: {record['input_path']} ({record['error']})", file=sys.stderr)
+            else:
+                counts["redacted"] += 1
+                print(f"Redacted file saved to: {record['output_path']}", file=sys.stderr)
+            results.write(json.dumps(record) + "\n")
+            results.flush()
+    return counts
+
+
+def main(argv: List[str] = None):
+    from pii_detector import DETECTOR_MODELS, DETECTION_MODES, NER_BACKENDS
+
+    parser = argparse.ArgumentParser(description="Redact PII from a corpus of recordings.")
+    parser.add_argument("source", help="Directory, glob pattern (quote it) or JSONL manifest of input_path entries")
+    parser.add_argument("--output-dir", required=True, help="Redacted files mirror the input layout here")
+    parser.add_argument("--results", default=None, help="JSONL file records are appended to "
+                                                        "(defaults to <output-dir>/results.jsonl)")
+    parser.add_argument("--shard", default="0/1", help="Process only shard i of N (0-based), e.g. 2/8")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (defaults to the CPU count)")
+    parser.add_argument("--overwrite", action="store_true", help="Redact files whose output already exists")
+    parser.add_argument("--include-transcript", action="store_true",
+                        help="Also record the unredacted transcript and entity values")
+    parser.add_argument("--model", choices=DETECTOR_MODELS, default="deberta")
+    parser.add_argument("--detection-mode", choices=DETECTION_MODES, default="model")
+    parser.add_argument("--ner-backend", choices=NER_BACKENDS, default="torch")
+    parser.add_argument("--whisper-model-size", default="medium")
+    parser.add_argument("--model-dir", default=None, help="Pre-downloaded models (see download_models.py)")
+    parser.add_argument("--offline", action="store_true", help="Never contact the Hugging Face hub")
+    parser.add_argument("--long-file-seconds", type=float, default=0.0)
+    parser.add_argument("--streaming", action="store_true",
+                        help="Transcribe, detect and write each file as one streaming chain")
+    args = parser.parse_args(argv)
+
+    shard = parse_shard(args.shard)
+    os.makedirs(args.output_dir, exist_ok=True)
+    results_path = args.results or os.path.join(args.output_dir, "results.jsonl")
+    detector_config = {
+        "whisper_model_size": args.whisper_model_size,
+        "model_type": args.model,
+        "detection_mode": args.detection_mode,
+        "ner_backend": args.ner_backend,
+        "model_dir": args.model_dir,
+        "offline": args.offline,
+        "long_file_seconds": args.long_file_seconds
+    }
+
+    skipped = 0
+
+    def tasks():
+        nonlocal skipped
+        for input_path, name, output_path in iter_inputs(args.source, exclude=args.output_dir):
+            if not in_shard(name, shard):
+                continue
+            output_path = output_path or output_path_for(name, args.output_dir)
+            if not args.overwrite and os.path.exists(output_path):
+                skipped += 1
+                continue
+            yield input_path, output_path
+
+    counts = bulk_redact(tasks(), detector_config, results_path, workers=args.workers,
+                         include_transcript=args.include_transcript, streaming=args.streaming)
+    print(f"Shard {args.shard}: {counts['redacted']} redacted, {counts['failed']} failed, "
+          f"{skipped} skipped (output exists); records in {results_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
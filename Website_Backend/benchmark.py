@@ -0,0 +1,328 @@
+"""Latency/accuracy benchmark for the PII pipeline, driven by the annotation dataset.
+
+Text runs replay every annotated transcript through the detector and score the
+predicted spans against the `[start, end, label]` annotations. Audio runs push
+WAV fixtures (`<id>.wav` in --audio-dir, or --synthesize placeholders) through
+every pipeline stage. Each configuration runs in a fresh process, so its load
+time and peak memory are its own. Results are written as JSON so runs from
+different commits can be diffed.
+
+    python benchmark.py --configs deberta,rules,hybrid --limit 200 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from alignment import WordAligner, normalize_value
+from pii_detector import PIIDetector, SAMPLE_RATE, decode_audio
+
+
+DEFAULT_DATASET = str(Path(__file__).resolve().parent.parent /
+                      "AI_Models" / "Dataset" / "Annotation" / "PII_audios_annotation.jsonl")
+
+# Benchmark configuration name -> (model_type, detection_mode)
+CONFIGS = {
+    "deberta": ("deberta", "model"),
+    "unsloth": ("unsloth", "model"),
+    "rules": ("deberta", "rules"),
+    "hybrid": ("deberta", "hybrid"),
+    "hybrid-unsloth": ("unsloth", "hybrid")
+}
+
+# Speaking rate used to size synthesized placeholder audio
+WORDS_PER_SECOND = 2.5
+
+
+def load_dataset(path: str, limit: int = None) -> List[Dict]:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+                if limit and len(records) >= limit:
+                    break
+    return records
+
+
+def percentiles(samples: List[float]) -> Dict:
+    """Summary of latency samples in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    values = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p90_ms": round(float(np.percentile(values, 90)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3)
+    }
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is the peak of the whole process, reported in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def entity_spans(text: str, entities: List[Dict]) -> List[Tuple[int, int, str]]:
+    """Character spans of predicted entities; value-only entities are located in the text."""
+    spans = []
+    lowered = text.lower()
+    for entity in entities:
+        if "start" in entity:
+            spans.append((entity["start"], entity["end"], entity["entity_type"]))
+            continue
+        value = entity["word"].lower().strip()
+        pos = lowered.find(value) if value else -1
+        while pos != -1:
+            spans.append((pos, pos + len(value), entity["entity_type"]))
+            pos = lowered.find(value, pos + 1)
+    return spans
+
+
+def _overlaps(a: Tuple[int, int, str], b: Tuple[int, int, str]) -> bool:
+    return a[2] == b[2] and a[0] < b[1] and b[0] < a[1]
+
+
+def score_spans(counts: Dict, gold: List[Tuple[int, int, str]], predicted: List[Tuple[int, int, str]]):
+    """Accumulate span-level TP/FP/FN per entity type (a hit is a same-type overlap)."""
+    matched = set()
+    for span in predicted:
+        hit = next((i for i, g in enumerate(gold) if i not in matched and _overlaps(span, g)), None)
+        if hit is None:
+            counts[span[2]]["fp"] += 1
+        else:
+            matched.add(hit)
+            counts[span[2]]["tp"] += 1
+            if (span[0], span[1]) == (gold[hit][0], gold[hit][1]):
+                counts[span[2]]["exact"] += 1
+    for i, g in enumerate(gold):
+        if i not in matched:
+            counts[g[2]]["fn"] += 1
+
+
+def score_values(counts: Dict, gold_values: List[Tuple[str, str]], predicted_values: List[Tuple[str, str]]):
+    """Accumulate value-level TP/FP/FN per entity type (for audio runs, where offsets differ)."""
+    remaining = list(gold_values)
+    for value, entity_type in predicted_values:
+        if (value, entity_type) in remaining:
+            remaining.remove((value, entity_type))
+            counts[entity_type]["tp"] += 1
+        else:
+            counts[entity_type]["fp"] += 1
+    for _, entity_type in remaining:
+        counts[entity_type]["fn"] += 1
+
+
+def accuracy_report(counts: Dict) -> Dict:
+    report = {}
+    totals = defaultdict(int)
+    for entity_type in sorted(counts):
+        c = counts[entity_type]
+        for k, v in c.items():
+            totals[k] += v
+        report[entity_type] = _prf(c)
+    report["ALL"] = _prf(totals)
+    return report
+
+
+def _prf(c: Dict) -> Dict:
+    tp, fp, fn = c.get("tp", 0), c.get("fp", 0), c.get("fn", 0)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    report = {"tp": tp, "fp": fp, "fn": fn,
+              "precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+    if "exact" in c:
+        report["exact_matches"] = c["exact"]
+    return report
+
+
+def run_text_benchmark(detector: PIIDetector, records: List[Dict]) -> Dict:
+    """Detect over the annotated transcripts and score against their spans."""
+    latencies = []
+    counts = defaultdict(lambda: defaultdict(int))
+    started = time.perf_counter()
+    for record in records:
+        text = record["text"]
+        t0 = time.perf_counter()
+        entities = detector.detect_entities(text)
+        latencies.append(time.perf_counter() - t0)
+        gold = [(s, e, label) for s, e, label in record["label"]]
+        score_spans(counts, gold, entity_spans(text, entities))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "records": len(records),
+        "latency": {"detect": percentiles(latencies)},
+        "throughput_docs_per_sec": round(len(records) / elapsed, 3) if elapsed else None,
+        "accuracy": accuracy_report(counts)
+    }
+
+
+def synthesize_fixture(record: Dict, folder: str) -> str:
+    """Placeholder WAV as long as the transcript would take to say (low noise, no speech).
+
+    Useful for stage latency and real-time factor only; its accuracy is meaningless.
+    """
+    path = os.path.join(folder, f"{record['id']}.wav")
+    if not os.path.exists(path):
+        duration = max(len(record["text"].split()) / WORDS_PER_SECOND, 1.0)
+        rng = np.random.default_rng(record["id"])
+        samples = (rng.standard_normal(int(duration * 16000)) * 0.01).astype(np.float32)
+        sf.write(path, samples, 16000, subtype="PCM_16")
+    return path
+
+
+def find_fixture(record: Dict, folder: str) -> str:
+    matches = sorted(Path(folder).glob(f"{record['id']}.*"))
+    return str(matches[0]) if matches else None
+
+
+def run_audio_benchmark(detector: PIIDetector, records: List[Dict], audio_dir: str,
+                        synthesize: bool, work_dir: str) -> Dict:
+    """Time every pipeline stage on audio fixtures and score entity values."""
+    stages = defaultdict(list)
+    counts = defaultdict(lambda: defaultdict(int))
+    audio_seconds = 0.0
+    files = 0
+    started = time.perf_counter()
+
+    for record in records:
+        source = synthesize_fixture(record, work_dir) if synthesize else find_fixture(record, audio_dir)
+        if source is None:
+            continue
+
+        # Decoded from the file's bytes through pipes, as the server does with uploads
+        data = Path(source).read_bytes()
+        t0 = time.perf_counter()
+        samples = decode_audio(data)
+        t1 = time.perf_counter()
+        transcription = detector.transcribe_audio(samples)
+        t2 = time.perf_counter()
+        aligner = WordAligner(transcription)
+        entities = detector.detect_entities(aligner.text)
+        t3 = time.perf_counter()
+        segments = detector.match_pii_to_segments(entities, transcription, aligner)
+        t4 = time.perf_counter()
+        output_path = os.path.join(work_dir, f"redacted_{record['id']}.wav")
+        detector.redact_audio(samples, output_path, segments)
+        t5 = time.perf_counter()
+        audio_seconds += len(samples) / SAMPLE_RATE
+
+        for stage, seconds in (("convert", t1 - t0), ("transcribe", t2 - t1), ("detect", t3 - t2),
+                               ("match", t4 - t3), ("redact", t5 - t4), ("total", t5 - t0)):
+            stages[stage].append(seconds)
+        files += 1
+
+        if not synthesize:
+            gold = [(normalize_value(record["text"][s:e]), label) for s, e, label in record["label"]]
+            predicted = [(normalize_value(entity["word"]), entity["entity_type"]) for entity in entities]
+            score_values(counts, gold, predicted)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "files": files,
+        "audio_seconds": round(audio_seconds, 3),
+        "latency": {stage: percentiles(samples) for stage, samples in stages.items()},
+        "throughput_files_per_sec": round(files / elapsed, 3) if files else None,
+        "real_time_factor": round(sum(stages["total"]) / audio_seconds, 4) if audio_seconds else None
+    }
+    if not synthesize:
+        report["accuracy"] = accuracy_report(counts)
+    return report
+
+
+def run_config(name: str, records: List[Dict], whisper_model_size: str, ner_backend: str,
+               audio_dir: str = None, synthesize: bool = False, work_dir: str = None) -> Dict:
+    """Benchmark one configuration; run in its own process, so peak_rss_bytes covers it alone."""
+    model_type, detection_mode = CONFIGS[name]
+    load_started = time.perf_counter()
+    detector = PIIDetector(whisper_model_size=whisper_model_size, model_type=model_type,
+                           detection_mode=detection_mode, ner_backend=ner_backend)
+    load_seconds = time.perf_counter() - load_started
+
+    report = {"model_type": model_type, "detection_mode": detection_mode,
+              "load_seconds": round(load_seconds, 3),
+              "text": run_text_benchmark(detector, records)}
+    if synthesize or audio_dir:
+        report["audio"] = run_audio_benchmark(detector, records, audio_dir, synthesize, work_dir)
+    report["peak_rss_bytes"] = peak_rss_bytes()
+    return report
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark PII detection latency and accuracy.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Annotation JSONL to replay")
+    parser.add_argument("--configs", default="deberta,rules,hybrid",
+                        help=f"Comma-separated configurations ({', '.join(CONFIGS)})")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N records")
+    parser.add_argument("--audio-dir", default=None, help="Folder of <id>.<ext> audio fixtures")
+    parser.add_argument("--synthesize", action="store_true",
+                        help="Generate placeholder audio (latency/RTF only) instead of using fixtures")
+    parser.add_argument("--whisper-model-size", default="base")
+    parser.add_argument("--ner-backend", default="torch", help="DeBERTa runtime (torch, onnx or onnx-int8)")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    records = load_dataset(args.dataset, args.limit)
+    run_audio = args.synthesize or args.audio_dir
+    work_dir = tempfile.mkdtemp(prefix="pii_bench_") if run_audio else None
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dataset": os.path.basename(args.dataset),
+        "ner_backend": args.ner_backend,
+        "records": len(records),
+        "configs": {}
+    }
+
+    names = [c.strip() for c in args.configs.split(",") if c.strip()]
+    for name in names:
+        if name not in CONFIGS:
+            parser.error(f"Unknown config: {name}")
+
+    # Spawned, so no configuration inherits the models or memory of another
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        print(f"Benchmarking {name}...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            report = executor.submit(run_config, name, records, args.whisper_model_size, args.ner_backend,
+                                     args.audio_dir, args.synthesize, work_dir).result()
+        results["configs"][name] = report
+
+        overall = report["text"]["accuracy"]["ALL"]
+        print(f"  detect p50 {report['text']['latency']['detect'].get('p50_ms')} ms, "
+              f"precision {overall['precision']}, recall {overall['recall']}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Download every model into one folder for offline deployments.
+
+    python download_models.py --model-dir models --whisper-model-size medium
+
+Point the server at the folder with PII_MODEL_DIR=models and PII_OFFLINE=1;
+PIIDetector(model_dir=..., offline=True) then loads from it without any hub lookups.
+"""
+import os
+import argparse
+from typing import List
+
+from pii_detector import DEBERTA_MODEL_ID, UNSLOTH_REPO_ID, UNSLOTH_FILENAME, DETECTOR_MODELS
+
+
+def download_models(model_dir: str, whisper_model_size: str = "medium", models: List[str] = DETECTOR_MODELS):
+    """Lay the models out the way PIIDetector.local_model_path expects them."""
+    from faster_whisper.utils import download_model
+    from huggingface_hub import hf_hub_download, snapshot_download
+
+    os.makedirs(model_dir, exist_ok=True)
+    print(f"Downloading Whisper {whisper_model_size}...")
+    download_model(whisper_model_size, output_dir=os.path.join(model_dir, f"faster-whisper-{whisper_model_size}"))
+    if "deberta" in models:
+        print(f"Downloading {DEBERTA_MODEL_ID}...")
+        snapshot_download(DEBERTA_MODEL_ID, local_dir=os.path.join(model_dir, DEBERTA_MODEL_ID.replace("/", "--")))
+    if "unsloth" in models:
+        print(f"Downloading {UNSLOTH_REPO_ID}/{UNSLOTH_FILENAME}...")
+        hf_hub_download(UNSLOTH_REPO_ID, UNSLOTH_FILENAME, local_dir=model_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-download the PII models for offline use.")
+    parser.add_argument("--model-dir", default=os.path.join(os.getcwd(), "models"))
+    parser.add_argument("--whisper-model-size", default="medium")
+    parser.add_argument("--models", default=",".join(DETECTOR_MODELS),
+                        help="Comma-separated detector models to fetch (deberta, unsloth)")
+    args = parser.parse_args()
+    download_models(args.model_dir, args.whisper_model_size, [m.strip() for m in args.models.split(",")])
+
+
+if __name__ == "__main__":
+    main()
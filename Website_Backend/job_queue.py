@@ -0,0 +1,109 @@
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from metrics import log_event
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobQueue:
+    """Interface of the background job backends used by the API.
+
+    `submit` runs `func(progress, *args)` in the background and returns a job
+    id; `func` may call `progress(stage, fraction)` to report where it is.
+    `get` returns the job's public state, or None for an unknown id.
+    """
+
+    def submit(self, func: Callable, *args) -> str:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        raise NotImplementedError
+
+
+class LocalJobQueue(JobQueue):
+    """In-process job queue backed by a thread pool.
+
+    At most `max_pending` jobs may be queued or running at once; further
+    submissions raise QueueFullError so the API can answer 429. Finished jobs
+    are kept for `retention_seconds` so clients can poll their results.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 16, retention_seconds: float = 3600):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+
+    def _purge(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] and job["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, func: Callable, *args) -> str:
+        with self._lock:
+            self._purge()
+            if self._pending() >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending jobs)")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "stage": None,
+                "progress": 0.0,
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None
+            }
+        self._executor.submit(self._run, job_id, func, args)
+        return job_id
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id: str, func: Callable, args: tuple):
+        self._update(job_id, status="running", started_at=time.time())
+
+        def progress(stage: str, fraction: float):
+            self._update(job_id, stage=stage, progress=round(min(max(fraction, 0.0), 1.0), 3))
+
+        try:
+            result = func(progress, *args)
+        except Exception as e:
+            log_event("job_failed", level=logging.ERROR, job_id=job_id, error=f"{type(e).__name__}: {e}")
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+        else:
+            self._update(job_id, status="done", stage="done", progress=1.0,
+                         result=result, finished_at=time.time())
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self._pending(),
+                "max_pending": self.max_pending,
+                "tracked": len(self._jobs)
+            }
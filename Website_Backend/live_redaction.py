@@ -0,0 +1,320 @@
+import re
+import time
+import threading
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from alignment import WordAligner
+from pii_detector import (PIIDetector, Padding, SAMPLE_RATE, VAD_FRAME_SECONDS, apply_intervals,
+                          flatten_intervals, hold_back_seconds, mute_intervals)
+from metrics import REGISTRY, timed, log_event
+from rule_detector import SPOKEN_DIGITS, SPOKEN_REPEATS
+
+
+# Wire formats accepted for live PCM (mono, little-endian)
+SAMPLE_FORMATS = {"s16le": np.int16, "f32le": np.float32}
+
+LIVE_SESSIONS = REGISTRY.gauge("pii_live_sessions", "Open live redaction sessions.")
+LIVE_LAG = REGISTRY.histogram(
+    "pii_live_lag_seconds", "Audio held back before release, measured at each released chunk.",
+    buckets=(0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0))
+
+# Live events are either redacted PCM (bytes) or JSON-serializable dicts
+Event = Union[bytes, Dict]
+
+# Words that may belong to a spoken or written number ("four", "double", "4111-")
+_NUMBER_WORD = re.compile(r"(?:" + "|".join(sorted({*SPOKEN_DIGITS, *SPOKEN_REPEATS}, key=len, reverse=True))
+                          + r"|[\d.\-]*\d[\d.\-]*)", re.IGNORECASE)
+
+
+def _is_number_word(text: str) -> bool:
+    return _NUMBER_WORD.fullmatch(text.strip().strip(",.?!;:")) is not None
+
+
+class SessionLimitError(Exception):
+    """Raised when a live session is opened while all session slots are taken."""
+
+
+class LiveRedactionHub:
+    """Shares one detector, and so one set of loaded models, across live sessions.
+
+    Sessions never load models of their own. At most `transcribe_slots`
+    sessions run Whisper at a time and `detect_slots` run the detector, so many
+    open sessions queue for the shared models instead of oversubscribing the CPU.
+    """
+
+    def __init__(self, detector: PIIDetector, max_sessions: int = 16, transcribe_slots: int = 2,
+                 detect_slots: int = 1):
+        self.detector = detector
+        self.max_sessions = max_sessions
+        self._transcribe_slots = threading.BoundedSemaphore(transcribe_slots)
+        self._detect_slots = threading.BoundedSemaphore(detect_slots)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.opened = 0
+
+    def open_session(self, **options) -> "LiveRedactionSession":
+        session = LiveRedactionSession(self, **options)
+        with self._lock:
+            if self.active >= self.max_sessions:
+                raise SessionLimitError(f"All {self.max_sessions} live sessions are in use")
+            self.active += 1
+            self.opened += 1
+            LIVE_SESSIONS.set(self.active)
+        return session
+
+    def close_session(self, session: "LiveRedactionSession"):
+        with self._lock:
+            self.active -= 1
+            LIVE_SESSIONS.set(self.active)
+
+    def transcribe(self, samples: np.ndarray) -> List[Dict]:
+        """Words of a 16 kHz buffer, times relative to its start."""
+        with self._transcribe_slots, timed(stage="live_transcribe"):
+            return list(self.detector.iter_transcription(samples))
+
+    def detect(self, text: str) -> List[Dict]:
+        with self._detect_slots, timed(stage="live_detect"):
+            # Rolling windows are never seen twice, so keep them out of the result cache
+            return self.detector.detect_entities(text, use_cache=False)
+
+    def stats(self) -> Dict:
+        return {"active": self.active, "max_sessions": self.max_sessions, "opened": self.opened}
+
+
+class LiveRedactionSession:
+    """Incremental redaction of one live PCM stream.
+
+    Audio is fed in arbitrary chunks. Every `step` seconds the unfinalized
+    tail (the rolling window) is re-transcribed unless the energy gate finds
+    only silence. Words ending more than `lookahead` seconds before the
+    newest audio are final. Detection runs over the last `context_words` final
+    words plus the tentative ones, and audio is released only up to the last
+    final word. Anything spoken after that point can still be muted, so
+    redacted audio trails the input by about `lookahead` + `step` seconds plus
+    processing time. Entity events are emitted once all of their words are final.
+    While the newest words are an unfinished number (a run of digit words,
+    or a number the rule tier cannot type yet), release stops before it,
+    since its first digits only become an entity once enough of them are
+    spoken; `max_hold` seconds caps how far release may then trail the input.
+    Padding, bridge gap and boundary snapping follow the detector's settings
+    unless `padding` is given.
+    """
+
+    def __init__(self, hub: LiveRedactionHub, sample_rate: int = SAMPLE_RATE, sample_format: str = "s16le",
+                 lookahead: float = 1.5, step: float = 0.5, context_words: int = 48,
+                 padding: Padding = None, fill: str = "silence", energy_threshold: float = 0.01,
+                 max_hold: float = 8.0):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        if fill not in ("silence", "beep"):
+            raise ValueError(f"Unsupported fill: {fill}")
+        if not 8000 <= sample_rate <= 48000:
+            raise ValueError(f"Unsupported sample rate: {sample_rate}")
+        if lookahead < 0 or step <= 0:
+            raise ValueError("lookahead must be >= 0 and step > 0")
+        if max_hold < 0:
+            raise ValueError("max_hold must be >= 0")
+
+        self.hub = hub
+        self.sample_rate = sample_rate
+        self.sample_format = sample_format
+        self.lookahead = lookahead
+        self.step = step
+        self.context_words = context_words
+        self.max_hold = max_hold
+        detector = hub.detector
+        self.padding = detector.padding if padding is None else padding
+        self.gap = detector.bridge_gap
+        self.snap = detector.snap_boundaries
+        # Audio a new segment's interval could still reach back over is not released
+        self.hold_back = hold_back_seconds(self.padding, self.gap, self.snap)
+        self.fill = fill
+        self.energy_threshold = energy_threshold
+
+        self._dtype = SAMPLE_FORMATS[sample_format]
+        self._remainder = b""
+        self._received = 0           # input samples received
+        self._emitted = 0            # input samples released
+        self._next_step = int(step * sample_rate)
+        self._unreleased = np.zeros(0, dtype=np.float32)  # samples from _emitted on
+        self._window = np.zeros(0, dtype=np.float32)      # samples from _window_start on
+        self._window_start = 0       # input sample where the unfinalized audio begins
+        self._final_until = 0.0      # seconds; the transcript before this is final
+        self._context = []           # recent final words, for detection context
+        self._segments = []          # mute segments that may still touch unreleased audio
+        self._reported = set()       # (entity_type, start) of entities already emitted
+        self._number_from = None     # seconds; start of a number that may still be being spoken
+        self.entities = 0
+        self.started_at = time.time()
+
+    def config(self) -> Dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "sample_format": self.sample_format,
+            "lookahead": self.lookahead,
+            "step": self.step,
+            "max_hold": self.max_hold,
+            "fill": self.fill
+        }
+
+    def feed(self, data: bytes) -> List[Event]:
+        """Add PCM bytes; returns the events (released audio, confirmed entities) now ready."""
+        data = self._remainder + data
+        usable = len(data) - len(data) % np.dtype(self._dtype).itemsize
+        self._remainder = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=self._dtype)
+        if self._dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        else:
+            samples = samples.astype(np.float32)
+
+        self._received += len(samples)
+        self._unreleased = np.concatenate([self._unreleased, samples])
+        self._window = np.concatenate([self._window, samples])
+
+        events = []
+        if self._received >= self._next_step:
+            self._next_step = self._received + int(self.step * self.sample_rate)
+            events.extend(self._process(final=False))
+        return events
+
+    def finish(self) -> List[Event]:
+        """Finalize everything received and release the rest of the audio."""
+        events = self._process(final=True)
+        events.append({
+            "type": "done",
+            "seconds": round(self._received / self.sample_rate, 3),
+            "entities": self.entities
+        })
+        log_event("live_session_done", audio_seconds=round(self._received / self.sample_rate, 3),
+                  entities=self.entities, wall_seconds=round(time.time() - self.started_at, 3))
+        return events
+
+    def _has_speech(self) -> bool:
+        frame = max(int(VAD_FRAME_SECONDS * self.sample_rate), 1)
+        usable = len(self._window) - len(self._window) % frame
+        if not usable:
+            return False
+        energy = np.sqrt(np.mean(self._window[:usable].reshape(-1, frame) ** 2, axis=1))
+        return bool(energy.max() >= self.energy_threshold)
+
+    def _to_whisper_rate(self) -> np.ndarray:
+        if self.sample_rate == SAMPLE_RATE:
+            return self._window
+        duration = len(self._window) / self.sample_rate
+        positions = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+        return np.interp(positions, np.arange(len(self._window)) / self.sample_rate,
+                         self._window).astype(np.float32)
+
+    def _advance_window(self, until: float):
+        """Drop window audio before `until` seconds; it will not be transcribed again."""
+        cut = min(int(until * self.sample_rate), self._received) - self._window_start
+        if cut > 0:
+            self._window = self._window[cut:]
+            self._window_start += cut
+
+    def _open_number(self, aligner: WordAligner, final_words: int) -> Optional[float]:
+        """Start (seconds) of a number that may still be growing: digit words reaching the
+        newest word, or a number the rule tier could not type that reaches the tentative words."""
+        words = aligner.words
+        first = len(words)
+        while first and _is_number_word(words[first - 1]['text']):
+            first -= 1
+        starts = [words[first]['start']] if first < len(words) else []
+        _, unresolved = self.hub.detector.rule_detector.scan(aligner.text)
+        for start, end in unresolved:
+            span = aligner.words_in_span(start, end)
+            if span and span[-1] >= final_words - 1:
+                starts.append(words[span[0]]['start'])
+        return min(starts) if starts else None
+
+    def _release_until(self, now: float, final: bool) -> float:
+        """Seconds of audio that can be released now."""
+        if final:
+            return now
+        until = self._final_until - self.hold_back
+        if self._number_from is not None:
+            until = min(until, max(self._number_from - self.hold_back, now - self.max_hold))
+        return until
+
+    def _process(self, final: bool) -> List[Event]:
+        events = []
+        now = self._received / self.sample_rate
+        cutoff = now if final else now - self.lookahead
+        offset = self._window_start / self.sample_rate
+
+        if not self._has_speech():
+            # Nothing said in the window: all but the lookahead tail is final
+            self._final_until = max(self._final_until, cutoff)
+            self._advance_window(self._final_until)
+            return self._release(self._release_until(now, final))
+
+        words = [dict(word, start=word['start'] + offset, end=word['end'] + offset)
+                 for word in self.hub.transcribe(self._to_whisper_rate())]
+        finalized = [word for word in words if word['end'] <= cutoff]
+        tentative = words[len(finalized):]
+
+        if finalized:
+            self._final_until = finalized[-1]['end']
+        elif not tentative:
+            self._final_until = max(self._final_until, cutoff)
+
+        # Detect over final context plus tentative words, so an entity that is
+        # still being spoken mutes its earlier, already-final words too
+        context = self._context + finalized
+        aligner = WordAligner(context + tentative)
+        ranges = aligner.entity_ranges(self.hub.detect(aligner.text)) if aligner.words else []
+        self._number_from = self._open_number(aligner, len(context))
+        released_until = self._emitted / self.sample_rate
+        self._segments.extend(segment for segment in aligner.segments_for(ranges)
+                              if segment['end'] + self.hold_back > released_until
+                              and segment not in self._segments)
+
+        for first, last, entity in sorted(ranges, key=lambda r: r[0]):
+            if last > len(context):
+                continue
+            key = (entity['entity_type'], round(aligner.words[first]['start'], 2))
+            if key in self._reported:
+                continue
+            self._reported.add(key)
+            self.entities += 1
+            events.append({
+                "type": "entity",
+                "entity_type": entity['entity_type'],
+                "text": " ".join(word['text'] for word in aligner.words[first:last]),
+                "start": aligner.words[first]['start'],
+                "end": aligner.words[last - 1]['end']
+            })
+
+        self._context = context[-self.context_words:]
+        if self._context:
+            horizon = round(self._context[0]['start'], 2)
+            self._reported = {key for key in self._reported if key[1] >= horizon}
+        self._advance_window(self._final_until)
+        events.extend(self._release(self._release_until(now, final)))
+        return events
+
+    def _release(self, until: float) -> List[Event]:
+        """Redact and return the audio up to `until` seconds."""
+        end = min(max(int(until * self.sample_rate), self._emitted), self._received)
+        if end <= self._emitted:
+            return []
+
+        # Snapping can only look at audio that has not been released yet
+        by_type = mute_intervals(
+            self._segments, self.padding, self.gap, self.snap,
+            lambda start, stop: self._unreleased[start - self._emitted:stop - self._emitted].reshape(-1, 1),
+            self._received, self.sample_rate, available_from=self._emitted)
+        block = self._unreleased[:end - self._emitted].reshape(-1, 1)
+        apply_intervals(block, flatten_intervals(by_type), self.sample_rate, offset=self._emitted, fill=self.fill)
+        self._unreleased = self._unreleased[end - self._emitted:]
+        self._emitted = end
+        released = end / self.sample_rate
+        self._segments = [s for s in self._segments if s['end'] + self.hold_back > released]
+        LIVE_LAG.observe(self._received / self.sample_rate - released)
+
+        if self._dtype == np.int16:
+            return [(np.clip(block[:, 0], -1.0, 32767 / 32768) * 32768).astype("<i2").tobytes()]
+        return [block[:, 0].astype("<f4").tobytes()]
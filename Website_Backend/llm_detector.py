@@ -0,0 +1,246 @@
+import os
+import re
+import queue
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from llama_cpp import Llama, LlamaGrammar
+
+from alignment import IGNORED_CHARS
+
+
+# Labels the fine-tuned LLM was trained to emit
+ENTITY_TYPES = ("NAME", "ADDRESS", "PHONE-NO", "BANK-ACCOUNT-NO", "BANK-ROUTING-NO", "CREDIT-CARD-NO", "SSN")
+
+# Few-shot prompt the model was tuned with; the text goes between PROMPT_PREFIX and PROMPT_SUFFIX
+PROMPT_PREFIX = """Extract the personally identifiable information (PII) from the following text. 
+        Only return entities in this format: <LABEL>: <ENTITY>
+
+        Example:
+        Input: "hi, i am lucas clark. i recently made a payment of $1,500 on my loan, but the payment hasn't been reflected. my credit card number is 4111 1111 1111 1111."
+        Response:
+        NAME: lucas clark
+        CREDIT-CARD-NO: 4111 1111 1111 1111
+        ###
+
+        Input:\""""
+PROMPT_SUFFIX = """"
+        Response:
+        """
+
+# The model's own "LABEL: value" lines, with labels restricted to ENTITY_TYPES
+GRAMMAR = (
+    'root ::= entry* "###"\n'
+    'entry ::= label ": " value "\\n"\n'
+    'label ::= ' + " | ".join(f'"{label}"' for label in ENTITY_TYPES) + '\n'
+    'value ::= [^\\n#]+\n'
+)
+
+# Output budget per chunk: at most every input token echoed once, plus one label line per few tokens
+OUTPUT_TOKENS_PER_INPUT = 1.5
+OUTPUT_TOKENS_BASE = 16
+
+_WORD = re.compile(r"\S+")
+
+
+def parse_entries(output: str) -> List[Tuple[str, str]]:
+    """(label, value) pairs from grammar-constrained output.
+
+    The grammar ends every entry with a newline, so an unterminated last line
+    was cut off by the token budget and is dropped.
+    """
+    entries = []
+    for line in output.split("\n")[:-1]:
+        if ": " in line:
+            label, value = line.split(": ", 1)
+            if label in ENTITY_TYPES and value.strip():
+                entries.append((label, value.strip()))
+    return entries
+
+
+def _on_word_boundaries(text: str, start: int, end: int) -> bool:
+    """Whether text[start:end] neither starts nor ends inside a word (letters and digits)."""
+    return ((start == 0 or not text[start - 1].isalnum())
+            and (end == len(text) or not text[end].isalnum()))
+
+
+def locate(text: str, value: str) -> List[Tuple[int, int]]:
+    """Character spans of `value` in `text`, on whole-word boundaries.
+
+    Exact (case-insensitive) matches are used first; otherwise separators
+    (IGNORED_CHARS) are ignored on both sides, so "4111-1111" finds "4111 1111".
+    Matches inside a longer word or number ("al" in "also", "4111" in
+    "14111") are skipped, as WordAligner does for value-only entities.
+    """
+    lowered = text.lower()
+    needle = value.lower()
+    spans = [(m.start(), m.end()) for m in re.finditer(re.escape(needle), lowered)
+             if _on_word_boundaries(lowered, m.start(), m.end())]
+    if spans:
+        return spans
+
+    kept = [i for i, ch in enumerate(lowered) if ch not in IGNORED_CHARS]
+    compact = "".join(lowered[i] for i in kept)
+    needle = "".join(ch for ch in needle if ch not in IGNORED_CHARS)
+    if not needle:
+        return []
+    spans = [(kept[m.start()], kept[m.end() - 1] + 1) for m in re.finditer(re.escape(needle), compact)]
+    return [(start, end) for start, end in spans if _on_word_boundaries(lowered, start, end)]
+
+
+class LlmDetector:
+    """Throughput-oriented wrapper around the fine-tuned GGUF model.
+
+    - A pool of `contexts` Llama instances. The GGUF weights are memory-mapped,
+      so the instances share one copy of the weights. Chunks of long
+      transcripts run on the pool in parallel.
+    - The few-shot prefix is evaluated once. Its KV state is saved and restored
+      before each call, so only the transcript chunk is evaluated.
+    - Output is constrained by a GBNF grammar to "LABEL: value" lines with
+      known labels, and the token budget is bounded by the chunk size.
+    - Values are mapped back to character offsets of the transcript. Values the
+      model paraphrased, and that cannot be located, are kept value-only.
+    """
+
+    def __init__(self, loader: Callable[..., Llama], contexts: int = 1, n_ctx: int = 2048,
+                 chunk_tokens: int = 384, overlap_words: int = 8, threads: int = 0):
+        self.contexts = contexts
+        self.chunk_tokens = chunk_tokens
+        self.overlap_words = overlap_words
+        # Threads per context; by default the contexts split the cores between them
+        threads = threads or max((os.cpu_count() or 1) // contexts, 1)
+        self._pool = queue.Queue()
+        self._llms = [loader(n_ctx=n_ctx, n_threads=threads) for _ in range(contexts)]
+        for llm in self._llms:
+            self._pool.put(llm)
+        self._grammar = LlamaGrammar.from_string(GRAMMAR, verbose=False)
+        self._prefix_state = None
+        self._executor = ThreadPoolExecutor(max_workers=contexts, thread_name_prefix="llm")
+
+    def __call__(self, prompt: str, **kwargs) -> Dict:
+        """Raw completion on a pooled context."""
+        with self._context() as llm:
+            return llm(prompt, **kwargs)
+
+    @contextmanager
+    def _context(self):
+        llm = self._pool.get()
+        try:
+            yield llm
+        finally:
+            self._pool.put(llm)
+
+    def _restore_prefix(self, llm: Llama):
+        """Put the evaluated few-shot prefix into `llm`'s KV cache."""
+        if self._prefix_state is None:
+            llm.reset()
+            llm.eval(llm.tokenize(PROMPT_PREFIX.encode("utf-8")))
+            # States are interchangeable between contexts of the same model
+            self._prefix_state = llm.save_state()
+        else:
+            llm.load_state(self._prefix_state)
+
+    def warm_up(self):
+        """Evaluate the prompt prefix ahead of traffic."""
+        with self._context() as llm:
+            self._restore_prefix(llm)
+
+    def _count_tokens(self, llm: Llama, text: str) -> int:
+        return len(llm.tokenize(text.encode("utf-8"), add_bos=False))
+
+    def chunk(self, text: str) -> List[Tuple[int, int]]:
+        """Split `text` into (start, end) spans of about `chunk_tokens` tokens at
+        word boundaries; consecutive chunks share `overlap_words` words."""
+        words = [m.span() for m in _WORD.finditer(text)]
+        if not words:
+            return []
+        # Tokenizing only reads the vocabulary, so any context will do
+        costs = [self._count_tokens(self._llms[0], " " + text[start:end]) for start, end in words]
+
+        chunks = []
+        first = 0
+        while first < len(words):
+            last = first
+            used = costs[first]
+            while last + 1 < len(words) and used + costs[last + 1] <= self.chunk_tokens:
+                last += 1
+                used += costs[last]
+            chunks.append((words[first][0], words[last][1]))
+            if last + 1 >= len(words):
+                break
+            first = max(last + 1 - self.overlap_words, first + 1)
+        return chunks
+
+    def _complete(self, chunk_text: str) -> List[Tuple[str, str]]:
+        with self._context() as llm:
+            self._restore_prefix(llm)
+            input_tokens = self._count_tokens(llm, chunk_text)
+            prompt_tokens = self._count_tokens(llm, PROMPT_PREFIX + chunk_text + PROMPT_SUFFIX) + 1
+            max_tokens = min(int(input_tokens * OUTPUT_TOKENS_PER_INPUT) + OUTPUT_TOKENS_BASE,
+                             llm.n_ctx() - prompt_tokens)
+            if max_tokens <= 0:
+                raise ValueError(f"Chunk of {input_tokens} tokens does not fit the context")
+            output = llm(
+                PROMPT_PREFIX + chunk_text + PROMPT_SUFFIX,
+                max_tokens=max_tokens,
+                temperature=0.0,
+                stop=["###"],
+                grammar=self._grammar
+            )
+        return parse_entries(output["choices"][0]["text"])
+
+    def _complete_or_error(self, chunk_text: str):
+        try:
+            return self._complete(chunk_text)
+        except Exception as e:
+            return e
+
+    def detect_batch(self, texts: List[str], return_exceptions: bool = False) -> List[List[Dict]]:
+        """Entities for each text; every chunk of every text shares the context pool.
+
+        A failing chunk fails only its own text: with `return_exceptions` the
+        text's entry is the exception, otherwise the first one is raised once
+        every chunk has finished.
+        """
+        jobs = [(i, start, end) for i, text in enumerate(texts) for start, end in self.chunk(text)]
+        outputs = self._executor.map(lambda job: self._complete_or_error(texts[job[0]][job[1]:job[2]]), jobs)
+
+        results = [[] for _ in texts]
+        seen = [set() for _ in texts]
+        failures = {}
+        for (i, chunk_start, chunk_end), entries in zip(jobs, outputs):
+            if isinstance(entries, Exception):
+                failures.setdefault(i, entries)
+                continue
+            chunk_text = texts[i][chunk_start:chunk_end]
+            for label, value in entries:
+                spans = locate(chunk_text, value)
+                if not spans:
+                    key = (label, value.lower())
+                    if key not in seen[i]:
+                        seen[i].add(key)
+                        results[i].append({"entity_type": label, "word": value})
+                    continue
+                for start, end in spans:
+                    key = (label, chunk_start + start, chunk_start + end)
+                    if key in seen[i]:
+                        continue
+                    seen[i].add(key)
+                    results[i].append({
+                        "entity_type": label,
+                        "start": chunk_start + start,
+                        "end": chunk_start + end,
+                        "word": texts[i][chunk_start + start:chunk_start + end]
+                    })
+
+        for entities in results:
+            entities.sort(key=lambda entity: entity.get("start", -1))
+        for i, failure in sorted(failures.items()):
+            if not return_exceptions:
+                raise failure
+            results[i] = failure
+        return results
+
+    def detect(self, text: str) -> List[Dict]:
+        return self.detect_batch([text])[0]
@@ -0,0 +1,224 @@
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+
+# Default histogram buckets in seconds, from a fast rule pass up to long LLM/Whisper runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+AUDIO_DURATION_BUCKETS = (5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+logger = logging.getLogger("pii")
+
+
+def _label_key(label_names: Tuple[str, ...], labels: Dict[str, str]) -> Tuple[str, ...]:
+    if set(labels) != set(label_names):
+        raise ValueError(f"Expected labels {label_names}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+
+def _format_labels(label_names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = []
+    for name, value in zip(label_names, values):
+        value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels; exposed as `<name>_total`."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    @property
+    def family(self) -> str:
+        # The text format wants the TYPE line to name the samples, suffix included
+        return f"{self.name}_total"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.label_names, labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.family}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge:
+    """Value that can go up and down (queue depths, loaded models...)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    @property
+    def family(self) -> str:
+        return self.name
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    @property
+    def family(self) -> str:
+        return self.name
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(self.label_names, labels))
+        return series["count"] if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = sorted((key, dict(s, counts=list(s["counts"]))) for key, s in self._series.items())
+        for key, s in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, s["counts"]):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(s['sum'])}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {s['count']}"
+
+
+class MetricsRegistry:
+    """Named set of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter, name, documentation, label_names)
+
+    def gauge(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, label_names)
+
+    def histogram(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, label_names, buckets)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.family} {metric.documentation}")
+            lines.append(f"# TYPE {metric.family} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry and the pipeline metrics shared by the detector and the API
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "pii_stage_seconds", "Time spent in each pipeline stage per call.", ("stage",))
+MODEL_SECONDS = REGISTRY.histogram(
+    "pii_model_inference_seconds", "Time spent in detector inference per call.", ("model",))
+AUDIO_DURATION = REGISTRY.histogram(
+    "pii_audio_duration_seconds", "Duration of processed audio files.", buckets=AUDIO_DURATION_BUCKETS)
+FILE_SECONDS = REGISTRY.histogram(
+    "pii_file_processing_seconds", "Wall time from transcription start to redacted file, per file.")
+FILES = REGISTRY.counter("pii_files", "Audio files redacted.")
+WORDS = REGISTRY.counter("pii_words_transcribed", "Words produced by transcription.")
+ENTITIES = REGISTRY.counter("pii_entities_detected", "PII entities detected.", ("entity_type",))
+SEGMENTS = REGISTRY.counter("pii_segments_muted", "Word segments muted in redacted audio.")
+
+
+@contextmanager
+def timed(histogram: Histogram = STAGE_SECONDS, **labels):
+    """Observe the wall time of the enclosed block into `histogram`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+def log_event(event: str, level: int = logging.INFO, **fields):
+    """Emit one structured (JSON) log line.
+
+    Callers pass counts, sizes, durations and entity types; transcript text and
+    entity values must only be logged after redaction.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps(dict(event=event, **fields), default=str))
+
+
+def entity_type_counts(entities: List[Dict]) -> Dict[str, int]:
+    counts = {}
+    for entity in entities:
+        counts[entity['entity_type']] = counts.get(entity['entity_type'], 0) + 1
+    return counts
@@ -0,0 +1,185 @@
+import gc
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (None where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def threads_per_slot(slots: int, budget: int = 0, models: int = 1) -> int:
+    """Threads for each of `slots` parallel instances of one of `models` models that run
+    side by side: `budget` threads (every core when 0) are split across the models,
+    then across each model's slots. A single slot keeps `budget` (0 being the library
+    default): a batch worker runs its models one after another, each on its whole share."""
+    if slots <= 1:
+        return budget
+    return max((budget or os.cpu_count() or 1) // (models * slots), 1)
+
+
+class ModelPool:
+    """Interchangeable instances of one model, each used by one caller at a time.
+
+    The pool size is the model's number of inference slots: extra callers
+    wait for an instance instead of running on a shared, non-thread-safe one.
+    The same object may be listed more than once when it is safe to call
+    concurrently and only the concurrency needs bounding.
+    """
+
+    def __init__(self, instances: List[Any]):
+        self.instances = list(instances)
+        self._idle = queue.Queue()
+        for instance in self.instances:
+            self._idle.put(instance)
+
+    @contextmanager
+    def acquire(self):
+        instance = self._idle.get()
+        try:
+            yield instance
+        finally:
+            self._idle.put(instance)
+
+    def stats(self) -> Dict[str, int]:
+        return {"slots": len(self.instances), "idle": self._idle.qsize()}
+
+
+class _Entry:
+    def __init__(self, name: str, loader: Callable[[], Any], warmup: Callable[[Any], None] = None,
+                 evictable: bool = False):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.evictable = evictable
+        self.model = None
+        self.load_lock = threading.Lock()
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.resident_bytes = None
+        self.last_used = None
+        self.loads = 0
+
+
+class ModelRegistry:
+    """Single owner of every loaded model.
+
+    Each registered model is loaded once on first `get` (or eagerly through
+    `warm_up`) and shared by all callers. Evictable models (the LLM) are
+    unloaded when they sit idle longer than `idle_timeout` seconds, or when the
+    models' combined resident size goes over `memory_budget` bytes. Callers
+    should fetch models from the registry each time rather than keep references,
+    so evicted models can actually be freed.
+    """
+
+    def __init__(self, memory_budget: int = None, idle_timeout: float = None):
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any], warmup: Callable[[Any], None] = None,
+                 evictable: bool = False):
+        """Declare a model; `warmup` runs a dummy inference so kernels are ready for real traffic."""
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(name, loader, warmup, evictable)
+
+    def names(self) -> List[str]:
+        return list(self._entries)
+
+    def is_loaded(self, name: str) -> bool:
+        return self._entries[name].model is not None
+
+    def get(self, name: str) -> Any:
+        """Return the model, loading it if needed."""
+        if name not in self._entries:
+            raise ValueError(f"Unknown model: {name}")
+        entry = self._entries[name]
+        if entry.model is None:
+            with entry.load_lock:
+                if entry.model is None:
+                    self._load(entry)
+        entry.last_used = time.time()
+        self._evict_idle(keep=name)
+        return entry.model
+
+    def _load(self, entry: _Entry):
+        print(f"Loading {entry.name} model...")
+        rss_before = current_rss()
+        started = time.perf_counter()
+        entry.model = entry.loader()
+        entry.load_seconds = round(time.perf_counter() - started, 3)
+        rss_after = current_rss()
+        if rss_before is not None and rss_after is not None:
+            entry.resident_bytes = max(rss_after - rss_before, 0)
+        entry.loads += 1
+        print(f"Loaded {entry.name} model in {entry.load_seconds}s")
+        self._enforce_budget(keep=entry.name)
+
+    def warm_up(self, names: List[str] = None):
+        """Load models ahead of traffic and run each one's dummy inference."""
+        for name in names or self.names():
+            entry = self._entries[name]
+            model = self.get(name)
+            if entry.warmup is not None:
+                started = time.perf_counter()
+                entry.warmup(model)
+                entry.warmup_seconds = round(time.perf_counter() - started, 3)
+
+    def evict(self, name: str):
+        entry = self._entries[name]
+        with entry.load_lock:
+            if entry.model is not None:
+                print(f"Evicting {name} model")
+                entry.model = None
+                entry.resident_bytes = None
+        gc.collect()
+
+    def resident_bytes(self) -> int:
+        return sum(entry.resident_bytes or 0 for entry in self._entries.values() if entry.model is not None)
+
+    def _evictable(self, keep: str) -> List[_Entry]:
+        """Loaded evictable models other than `keep`, least recently used first."""
+        candidates = [entry for entry in self._entries.values()
+                      if entry.evictable and entry.model is not None and entry.name != keep]
+        return sorted(candidates, key=lambda entry: entry.last_used or 0)
+
+    def _enforce_budget(self, keep: str):
+        if not self.memory_budget:
+            return
+        for entry in self._evictable(keep):
+            if self.resident_bytes() <= self.memory_budget:
+                break
+            self.evict(entry.name)
+
+    def _evict_idle(self, keep: str):
+        if not self.idle_timeout:
+            return
+        cutoff = time.time() - self.idle_timeout
+        for entry in self._evictable(keep):
+            if entry.last_used is not None and entry.last_used < cutoff:
+                self.evict(entry.name)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Load state, load/warm-up times and resident size of every model."""
+        return {
+            name: {
+                "loaded": entry.model is not None,
+                "loads": entry.loads,
+                "load_seconds": entry.load_seconds,
+                "warmup_seconds": entry.warmup_seconds,
+                "resident_bytes": entry.resident_bytes,
+                "evictable": entry.evictable,
+                "last_used": entry.last_used
+            }
+            for name, entry in self._entries.items()
+        }
@@ -0,0 +1,275 @@
+"""ONNX Runtime backend for the DeBERTa token classifier.
+
+The model is exported (and optionally int8-quantized) once into a cache folder,
+checked against the PyTorch pipeline, and then served with onnxruntime and
+the `tokenizers` library only, so neither torch nor transformers is imported at
+runtime. Export ahead of deployment with:
+
+    python onnx_ner.py --output-dir onnx_models
+"""
+import os
+import json
+import time
+import argparse
+from types import SimpleNamespace
+from typing import Dict, List, Union
+
+import numpy as np
+
+
+ONNX_BACKENDS = ("onnx", "onnx-int8")
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+METADATA_FILE = "export.json"
+
+# Spans must agree this often with the PyTorch pipeline (fp32 should match exactly)
+PARITY_MIN_AGREEMENT = {"onnx": 0.99, "onnx-int8": 0.9}
+
+# Transcript-like sentences for the parity check, covering every entity type
+PARITY_TEXTS = [
+    "hi, i am lucas clark. my credit card number is 4111 1111 1111 1111.",
+    "this is maria gonzalez calling from 4821 oak ridge drive, austin, texas 78745.",
+    "you can reach me at 415-555-0132 or on my cell, four one five five five five zero one three two.",
+    "my social security number is 589-90-4308 and my account number is 00123456789.",
+    "the routing number for the transfer is 021000021, please send it to james o'brien.",
+    "i moved to 12 baker street apartment 4b last month, my name is priya natarajan.",
+    "thanks for calling, is there anything else i can help you with today?"
+]
+
+
+def export_dir(cache_dir: str, model_id: str) -> str:
+    return os.path.join(cache_dir, model_id.replace("/", "--"))
+
+
+def model_path(model_dir: str, backend: str) -> str:
+    return os.path.join(model_dir, QUANTIZED_MODEL_FILE if backend == "onnx-int8" else MODEL_FILE)
+
+
+def is_exported(model_dir: str, backend: str) -> bool:
+    return (os.path.exists(os.path.join(model_dir, METADATA_FILE))
+            and os.path.exists(model_path(model_dir, backend)))
+
+
+def _get_tag(label: str):
+    """Split a BIO label the way the transformers pipeline does."""
+    if label.startswith("B-"):
+        return "B", label[2:]
+    if label.startswith("I-"):
+        return "I", label[2:]
+    return "I", label
+
+
+class OnnxTokenClassifier:
+    """Drop-in replacement for the transformers "ner" pipeline with
+    aggregation_strategy="simple", running an exported model on onnxruntime.
+
+    Calling it with a string returns that text's entity groups; calling it
+    with a list returns one list per text. It also stands in for the
+    tokenizer (`tokenize`) and the model (`config`) where the detector uses them.
+    """
+
+    def __init__(self, model_dir: str, backend: str = "onnx", threads: int = 0):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, METADATA_FILE), "r", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+        self.id2label = {int(k): v for k, v in self.metadata["id2label"].items()}
+        self.input_names = self.metadata["input_names"]
+        self.pad_token_id = self.metadata["pad_token_id"]
+        self.config = SimpleNamespace(_commit_hash=self.metadata.get("revision"), id2label=self.id2label)
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path(model_dir, backend), options,
+                                                    providers=["CPUExecutionProvider"])
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(self.metadata["max_length"])
+        # Untruncated copy for tokenize(), so the detector sees long texts at their
+        # real length and windows them instead of losing everything past max_length
+        self._counting_tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._counting_tokenizer.no_padding()
+        self._counting_tokenizer.no_truncation()
+
+    def tokenize(self, text: str) -> List[str]:
+        return self._counting_tokenizer.encode(text, add_special_tokens=False).tokens
+
+    def __call__(self, inputs: Union[str, List[str]], batch_size: int = 8, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        results = []
+        for begin in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[begin:begin + batch_size])
+            length = max(len(encoding.ids) for encoding in encodings)
+            input_ids = np.full((len(encodings), length), self.pad_token_id, dtype=np.int64)
+            attention_mask = np.zeros((len(encodings), length), dtype=np.int64)
+            for i, encoding in enumerate(encodings):
+                input_ids[i, :len(encoding.ids)] = encoding.ids
+                attention_mask[i, :len(encoding.ids)] = 1
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask,
+                     "token_type_ids": np.zeros_like(input_ids)}
+            logits = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+            results.extend(self._aggregate(encoding, row[:len(encoding.ids)])
+                           for encoding, row in zip(encodings, logits))
+        return results[0] if isinstance(inputs, str) else results
+
+    def _aggregate(self, encoding, logits: np.ndarray) -> List[Dict]:
+        """Per-token argmax labels grouped into entities ("simple" aggregation)."""
+        shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        scores = shifted / shifted.sum(axis=-1, keepdims=True)
+
+        tokens = []
+        for index, (token_id, special, (start, end)) in enumerate(
+                zip(encoding.ids, encoding.special_tokens_mask, encoding.offsets)):
+            if special:
+                continue
+            label = int(scores[index].argmax())
+            tokens.append({"entity": self.id2label[label], "score": float(scores[index, label]),
+                           "id": token_id, "start": start, "end": end})
+
+        groups = []
+        current = []
+        for token in tokens:
+            bi, tag = _get_tag(token["entity"])
+            if current and tag == _get_tag(current[-1]["entity"])[1] and bi != "B":
+                current.append(token)
+                continue
+            if current:
+                groups.append(current)
+            current = [token]
+        if current:
+            groups.append(current)
+
+        entities = []
+        for group in groups:
+            tag = _get_tag(group[0]["entity"])[1]
+            if tag == "O":
+                continue
+            entities.append({
+                "entity_group": tag,
+                "score": float(np.mean([token["score"] for token in group])),
+                "word": self.tokenizer.decode([token["id"] for token in group]),
+                "start": group[0]["start"],
+                "end": group[-1]["end"]
+            })
+        return entities
+
+
+def span_agreement(reference: List[List[Dict]], candidate: List[List[Dict]]) -> float:
+    """Share of (type, start, end) entity spans the two outputs have in common."""
+    expected = {(i, e["entity_group"], e["start"], e["end"]) for i, es in enumerate(reference) for e in es}
+    actual = {(i, e["entity_group"], e["start"], e["end"]) for i, es in enumerate(candidate) for e in es}
+    union = expected | actual
+    return len(expected & actual) / len(union) if union else 1.0
+
+
+def export_model(model_id: str, model_dir: str, quantize: bool = True, parity_texts: List[str] = None,
+                 source: str = None) -> Dict:
+    """Export `model_id` to ONNX (plus an int8 copy), then check both against PyTorch.
+
+    This is the only step that needs torch and transformers. The weights are
+    read from `source` (a local copy) when given. The parity report is stored
+    next to the model and returned.
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+
+    os.makedirs(model_dir, exist_ok=True)
+    print(f"Exporting {model_id} to ONNX in {model_dir}...")
+    tokenizer = AutoTokenizer.from_pretrained(source or model_id)
+    model = AutoModelForTokenClassification.from_pretrained(source or model_id).eval()
+    tokenizer.save_pretrained(model_dir)
+    if not os.path.exists(os.path.join(model_dir, "tokenizer.json")):
+        raise RuntimeError(f"{model_id} has no fast tokenizer; the ONNX backend needs tokenizer.json")
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    # Positional order of the model's forward()
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["logits"]}
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in input_names),
+                          os.path.join(model_dir, MODEL_FILE), input_names=input_names,
+                          output_names=["logits"], dynamic_axes=dynamic_axes, opset_version=14)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(os.path.join(model_dir, MODEL_FILE), os.path.join(model_dir, QUANTIZED_MODEL_FILE),
+                         weight_type=QuantType.QInt8)
+
+    metadata = {
+        "model_id": model_id,
+        "revision": getattr(model.config, "_commit_hash", None),
+        "id2label": {str(k): v for k, v in model.config.id2label.items()},
+        "input_names": input_names,
+        "pad_token_id": tokenizer.pad_token_id or 0,
+        "max_length": min(tokenizer.model_max_length, 512),
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parity": {}
+    }
+    with open(os.path.join(model_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+    # Parity: same texts through the PyTorch pipeline and each exported variant
+    texts = parity_texts or PARITY_TEXTS
+    reference = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")(texts)
+    for backend in ONNX_BACKENDS:
+        if not os.path.exists(model_path(model_dir, backend)):
+            continue
+        agreement = span_agreement(reference, OnnxTokenClassifier(model_dir, backend)(texts))
+        passed = agreement >= PARITY_MIN_AGREEMENT[backend]
+        metadata["parity"][backend] = {"span_agreement": round(agreement, 4), "texts": len(texts), "passed": passed}
+        print(f"{backend} parity with PyTorch: {agreement:.2%} of entity spans agree"
+              + ("" if passed else " (below threshold)"))
+
+    with open(os.path.join(model_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def read_parity(model_dir: str, backend: str) -> Dict:
+    """Parity report stored at export time (None if it was never checked)."""
+    with open(os.path.join(model_dir, METADATA_FILE), "r", encoding="utf-8") as f:
+        return json.load(f).get("parity", {}).get(backend)
+
+
+def load_classifier(model_id: str, cache_dir: str, backend: str, threads: int = 0,
+                    source: str = None) -> OnnxTokenClassifier:
+    """ONNX classifier for `model_id`, exporting it (from `source` if given) when the cache has no copy."""
+    model_dir = export_dir(cache_dir, model_id)
+    if not is_exported(model_dir, backend):
+        # One export produces both variants
+        export_model(model_id, model_dir, quantize=True, source=source)
+    parity = read_parity(model_dir, backend)
+    if parity and not parity["passed"]:
+        print(f"Warning: {backend} export of {model_id} agrees with PyTorch on only "
+              f"{parity['span_agreement']:.2%} of entity spans")
+    return OnnxTokenClassifier(model_dir, backend, threads)
+
+
+def main(argv: List[str] = None):
+    from pii_detector import DEBERTA_MODEL_ID
+
+    parser = argparse.ArgumentParser(description="Export the DeBERTa PII model to ONNX and check parity.")
+    parser.add_argument("--model-id", default=DEBERTA_MODEL_ID)
+    parser.add_argument("--output-dir", default=os.path.join(os.getcwd(), "onnx_models"))
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 copy")
+    parser.add_argument("--parity-dataset", default=None,
+                        help="Annotation JSONL whose texts are used for the parity check")
+    parser.add_argument("--parity-limit", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    texts = None
+    if args.parity_dataset:
+        with open(args.parity_dataset, "r", encoding="utf-8") as f:
+            texts = [json.loads(line)["text"] for line in f if line.strip()][:args.parity_limit]
+
+    metadata = export_model(args.model_id, export_dir(args.output_dir, args.model_id),
+                            quantize=not args.no_quantize, parity_texts=texts)
+    print(json.dumps(metadata["parity"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
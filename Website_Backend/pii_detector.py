@@ -1,21 +1,337 @@
 import os
-from pathlib import Path
-from faster_whisper import WhisperModel
-import ffmpeg
-from functools import lru_cache
-from llama_cpp import Llama
-from typing import Dict, List, Union
-from transformers import pipeline, AutoTokenizer, AutoModelForTokenClassification,AutoModelForCausalLM
-import torch
 import re
+import copy
+import math
+import time
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+import soundfile as sf
+from alignment import WordAligner, normalize_value, word_separator
+from pipeline_executor import PipelineStage, StagedPipeline
+from cache import ResultCache, hash_bytes, hash_file, hash_text, make_key
+from model_registry import ModelRegistry, ModelPool, threads_per_slot
+from rule_detector import RuleDetector, STRUCTURED_TYPES
+from text_redaction import TextRedactor
+from metrics import (logger, timed, log_event, entity_type_counts, MODEL_SECONDS, AUDIO_DURATION,
+                     FILE_SECONDS, FILES, WORDS, ENTITIES, SEGMENTS)
 import json
 
+
+DEBERTA_MODEL_ID = "AI-Enthusiast11/pii-entity-extractor"
+UNSLOTH_REPO_ID = "AI-Enthusiast11/mistral-7b-4bit-pii-entity-extractor"
+UNSLOTH_FILENAME = "unsloth.Q4_K_M.gguf"
+
+# Detection models, chosen per call (model_type=...) or as the default through set_model
+DETECTOR_MODELS = ("deberta", "unsloth")
+
+# model: ML model only; rules: rule tier only; hybrid: rules first, ML only where still needed
+DETECTION_MODES = ("model", "rules", "hybrid")
+
+# DeBERTa runtimes: the transformers pipeline, or an ONNX export (fp32 or int8) on onnxruntime
+NER_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Decoding options shared by every transcription call (also part of the cache key)
+WHISPER_TRANSCRIBE_OPTIONS = {"word_timestamps": True, "vad_filter": True}
+
+# DeBERTa reads at most 512 tokens and the pipeline truncates silently, so longer
+# texts are detected in windows of NER_WINDOW_TOKENS that overlap by NER_OVERLAP_TOKENS
+NER_WINDOW_TOKENS = 384
+NER_OVERLAP_TOKENS = 64
+
+# Whisper's native input rate; decoded buffers and converted WAVs use it
+SAMPLE_RATE = 16000
+
+# A path on disk, or a mono float32 buffer at SAMPLE_RATE already in memory
+AudioInput = Union[str, np.ndarray]
+
+# 30 ms frames for energy-based voice activity (live energy gate, long-file split points)
+VAD_FRAME_SECONDS = 0.03
+
+# Long files are cut in the quietest stretch of this length; chunks are decoded with
+# CHUNK_OVERLAP_SECONDS of neighbouring audio on each side, and a word near a cut
+# may be claimed by both chunks within EDGE_TOLERANCE_SECONDS (duplicates are dropped)
+SPLIT_SILENCE_SECONDS = 0.3
+CHUNK_OVERLAP_SECONDS = 1.0
+EDGE_TOLERANCE_SECONDS = 0.25
+
+BEEP_FREQUENCY = 1000.0
+BEEP_AMPLITUDE = 0.2
+
+# Seconds added around each muted word: one value, or {entity_type: seconds} with an optional "default"
+Padding = Union[float, Dict[str, float]]
+DEFAULT_PADDING = 0.1
+
+# Boundary snapping: 10 ms energy frames, searched up to SNAP_WINDOW_SECONDS outside each interval
+SNAP_FRAME_SECONDS = 0.01
+SNAP_WINDOW_SECONDS = 0.2
+
+
+def padding_for(padding: Padding, entity_type: str = None) -> float:
+    if isinstance(padding, dict):
+        return padding.get(entity_type, padding.get("default", DEFAULT_PADDING))
+    return padding
+
+
+def merge_intervals(segments: List[Dict], padding: Padding = DEFAULT_PADDING,
+                    gap: float = 0.0) -> List[Tuple[float, float]]:
+    """Pad segments and merge the ones that overlap or sit within `gap` seconds of each other."""
+    padded = sorted(
+        (max(segment['start'] - padding_for(padding, segment.get('entity_type')), 0.0),
+         segment['end'] + padding_for(padding, segment.get('entity_type')))
+        for segment in segments
+    )
+
+    merged = []
+    for start, end in padded:
+        if merged and start <= merged[-1][1] + gap:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def intervals_by_type(segments: List[Dict], padding: Padding = DEFAULT_PADDING,
+                      gap: float = 0.0) -> Dict[str, List[Tuple[float, float]]]:
+    """One sorted, non-overlapping list of padded intervals per entity type.
+
+    Consecutive words of a read-out number become a single interval, and
+    intervals closer than `gap` seconds are bridged.
+    """
+    grouped = {}
+    for segment in segments:
+        grouped.setdefault(segment.get('entity_type', 'PII'), []).append(segment)
+    return {entity_type: merge_intervals(group, padding, gap) for entity_type, group in sorted(grouped.items())}
+
+
+def flatten_intervals(by_type: Dict[str, List[Tuple[float, float]]]) -> List[Tuple[float, float]]:
+    """Union of every type's intervals: what is actually muted."""
+    return merge_intervals([{"start": start, "end": end} for intervals in by_type.values()
+                            for start, end in intervals], padding=0.0)
+
+
+def snap_intervals(intervals: List[Tuple[float, float]], samples: np.ndarray, sample_rate: int,
+                   window: float = SNAP_WINDOW_SECONDS) -> List[Tuple[float, float]]:
+    """Widen each interval to the nearest quiet frame within `window` seconds of its edges.
+
+    Word timestamps (especially with the VAD filter) can be off by tens of
+    milliseconds, which lets the edge of a muted word through. Edges move
+    outwards only, to the first quiet frame (within twice the file's
+    10th-percentile energy, i.e. its noise floor), or to the quietest frame in
+    the window if none is that quiet.
+    """
+    frame = max(int(SNAP_FRAME_SECONDS * sample_rate), 1)
+    count = len(samples) // frame
+    if not count or not intervals:
+        return list(intervals)
+    energy = np.sqrt(np.mean(samples[:count * frame].astype(np.float32).reshape(count, frame) ** 2, axis=1))
+    quiet = 2 * np.percentile(energy, 10)
+    reach = max(int(round(window / SNAP_FRAME_SECONDS)), 1)
+
+    def search(frames: np.ndarray) -> int:
+        """Index in `frames` (ordered outwards) of the frame to cut at."""
+        hits = np.flatnonzero(energy[frames] <= quiet)
+        return int(hits[0]) if len(hits) else int(np.argmin(energy[frames]))
+
+    snapped = []
+    for start, end in intervals:
+        first = int(start * sample_rate) // frame
+        last = int(math.ceil(end * sample_rate)) // frame
+        if first < count:
+            frames = np.arange(first, max(first - reach, 0) - 1, -1)
+            start = min(start, float(frames[search(frames)] * frame / sample_rate))
+        if last < count:
+            frames = np.arange(last, min(last + reach, count - 1) + 1)
+            end = max(end, float((frames[search(frames)] + 1) * frame / sample_rate))
+        snapped.append({"start": start, "end": end})
+    return merge_intervals(snapped, padding=0.0)
+
+
+def hold_back_seconds(padding: Padding, gap: float = 0.0, snap: bool = False) -> float:
+    """How far before a segment's start its mute interval can reach: the largest padding,
+    a bridged gap and the snapping window. Streaming writers keep this much audio back."""
+    paddings = list(padding.values()) if isinstance(padding, dict) else [padding]
+    if isinstance(padding, dict) and "default" not in padding:
+        paddings.append(DEFAULT_PADDING)
+    return max(paddings) + gap + (SNAP_WINDOW_SECONDS if snap else 0.0)
+
+
+def mute_intervals(segments: List[Dict], padding: Padding, gap: float, snap: bool,
+                   read, frames: int, sample_rate: int, available_from: int = 0
+                   ) -> Dict[str, List[Tuple[float, float]]]:
+    """intervals_by_type for audio that is never in memory as a whole (streaming, live).
+
+    With `snap`, each interval is snapped within its own excerpt: the interval
+    plus twice the snapping window on each side, as far as frames
+    `available_from` to `frames` allow, fetched with `read(start, stop)`. The
+    excerpt's quietest frames stand in for the whole file's noise floor.
+    """
+    by_type = intervals_by_type(segments, padding, gap)
+    if not snap:
+        return by_type
+    margin = int(2 * SNAP_WINDOW_SECONDS * sample_rate)
+    snapped = {}
+    for entity_type, intervals in by_type.items():
+        widened = []
+        for start, end in intervals:
+            first = min(max(int(start * sample_rate) - margin, available_from), frames)
+            last = min(int(math.ceil(end * sample_rate)) + margin, frames)
+            offset = first / sample_rate
+            excerpt = read(first, last)[:, 0] if last > first else np.zeros(0, dtype=np.float32)
+            widened.extend({"start": start + offset, "end": end + offset}
+                           for start, end in snap_intervals([(start - offset, end - offset)], excerpt, sample_rate))
+        snapped[entity_type] = merge_intervals(widened, padding=0.0)
+    return snapped
+
+
+@contextmanager
+def open_audio(audio: AudioInput):
+    """(sample_rate, channels, frames, subtype, read) for a path or a decoded buffer, where
+    read(start, stop) returns those frames as a float32 array of shape (frames, channels)."""
+    if isinstance(audio, str):
+        with sf.SoundFile(audio) as source:
+            def read(start: int, stop: int) -> np.ndarray:
+                source.seek(start)
+                return source.read(stop - start, dtype="float32", always_2d=True)
+            yield source.samplerate, source.channels, source.frames, source.subtype, read
+    else:
+        samples = audio.reshape(-1, 1)
+        yield SAMPLE_RATE, 1, len(samples), "PCM_16", lambda start, stop: samples[start:stop].copy()
+
+
+def split_on_silence(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, min_seconds: float = 30.0,
+                     max_seconds: float = 60.0) -> List[Tuple[int, int]]:
+    """(start, end) sample ranges of `min_seconds` to `max_seconds` covering `samples`.
+
+    Each cut goes in the middle of the quietest SPLIT_SILENCE_SECONDS stretch
+    (by mean frame energy) that the allowed range offers, which is a pause
+    between words whenever the speaker makes one.
+    """
+    total = len(samples)
+    frame = max(int(VAD_FRAME_SECONDS * sample_rate), 1)
+    count = total // frame
+    min_samples, max_samples = int(min_seconds * sample_rate), int(max_seconds * sample_rate)
+    if total <= max_samples or not count:
+        return [(0, total)]
+
+    energy = np.sqrt(np.mean(samples[:count * frame].astype(np.float32).reshape(count, frame) ** 2, axis=1))
+    width = max(int(round(SPLIT_SILENCE_SECONDS / VAD_FRAME_SECONDS)), 1)
+    smoothed = np.convolve(energy, np.ones(width) / width, mode="same")
+
+    cuts = [0]
+    while total - cuts[-1] > max_samples:
+        low = (cuts[-1] + min_samples) // frame
+        high = min((cuts[-1] + max_samples) // frame, count)
+        if low >= high:
+            cuts.append(cuts[-1] + max_samples)
+            continue
+        quietest = low + int(np.argmin(smoothed[low:high]))
+        cuts.append(quietest * frame + frame // 2)
+    cuts.append(total)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def compact_intervals(by_type: Dict[str, List[Tuple[float, float]]]) -> Dict[str, List[List[float]]]:
+    """JSON form of per-type intervals, rounded to the millisecond: {"NAME": [[0.42, 1.13]], ...}."""
+    return {entity_type: [[round(start, 3), round(end, 3)] for start, end in intervals]
+            for entity_type, intervals in by_type.items()}
+
+
+def apply_intervals(samples: np.ndarray, intervals: List[Tuple[float, float]], sample_rate: int,
+                    offset: int = 0, fill: str = "silence"):
+    """Silence or beep-fill `intervals` (in seconds) inside a block that starts at sample `offset`."""
+    total = len(samples)
+    for start, end in intervals:
+        first = min(max(int(start * sample_rate) - offset, 0), total)
+        last = min(max(int(math.ceil(end * sample_rate)) - offset, 0), total)
+        if first >= last:
+            continue
+        if fill == "beep":
+            t = np.arange(offset + first, offset + last, dtype=np.float64) / sample_rate
+            tone = BEEP_AMPLITUDE * np.sin(2 * np.pi * BEEP_FREQUENCY * t)
+            samples[first:last] = tone.astype(np.float32)[:, None]
+        else:
+            samples[first:last] = 0.0
+
+
+def convert_file_to_wav(input_path):
+    """Convert an audio file on disk to 16 kHz mono WAV using ffmpeg."""
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
+        command = [
+            "ffmpeg", "-y",
+            "-i", input_path,
+            "-ar", str(SAMPLE_RATE),
+            "-ac", "1",
+            temp_wav.name
+        ]
+        try:
+            with timed(stage="convert"):
+                subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        except Exception:
+            os.unlink(temp_wav.name)
+            raise
+        return temp_wav.name
+
+
+def decode_audio(source: Union[str, bytes]) -> np.ndarray:
+    """Decode any ffmpeg-readable audio (a path, or the raw bytes of an upload)
+    to a mono float32 buffer at SAMPLE_RATE, entirely through pipes."""
+    from_memory = not isinstance(source, str)
+    command = ["ffmpeg", "-i", "pipe:0"] if from_memory else ["ffmpeg", "-nostdin", "-i", source]
+    command += ["-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"]
+    with timed(stage="convert"):
+        process = subprocess.run(command, input=source if from_memory else None,
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if from_memory and (process.returncode or not process.stdout):
+        # Containers indexed at the end (e.g. MP4/M4A) cannot be demuxed from a pipe
+        with tempfile.NamedTemporaryFile() as temp_input:
+            temp_input.write(source)
+            temp_input.flush()
+            return decode_audio(temp_input.name)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    # frombuffer views the (read-only) bytes; redaction edits the buffer in place
+    return np.frombuffer(process.stdout, dtype=np.float32).copy()
+
+
+def _output_subtype(output_path: str, subtype: str):
+    """Keep the input encoding when the output container supports it."""
+    output_format = Path(output_path).suffix.lstrip(".").upper()
+    return subtype if sf.check_format(output_format, subtype) else None
+
+
 class PIIDetector:
     def __init__(self, 
                  whisper_model_size: str = "base", 
                  compute_type: str = "int8", 
                  device: str = "cpu",
-                 model_type: str = "deberta"):
+                 model_type: str = "deberta",
+                 cpu_threads: int = 0,
+                 cache_dir: str = None,
+                 cache_max_bytes: int = 1 << 30,
+                 registry: ModelRegistry = None,
+                 detection_mode: str = "model",
+                 llm_contexts: int = 1,
+                 ner_backend: str = "torch",
+                 onnx_dir: str = None,
+                 model_dir: str = None,
+                 offline: bool = False,
+                 preload: bool = True,
+                 whisper_slots: int = 1,
+                 ner_slots: int = 1,
+                 padding: Padding = DEFAULT_PADDING,
+                 bridge_gap: float = 0.0,
+                 snap_boundaries: bool = False,
+                 long_file_seconds: float = 0.0,
+                 chunk_min_seconds: float = 30.0,
+                 chunk_max_seconds: float = 60.0):
                  
         """
         Initialize PII detector with configurable models.
@@ -25,50 +341,230 @@ class PIIDetector:
             compute_type: Computation type for Whisper (int8, float16, etc.)
             device: Device to use (cpu or cuda)
             model_type: Default model type (deberta or unsloth)
+            cpu_threads: CPU threads for the required models together, split across them and then
+                across each model's slots (0 with single slots keeps the library defaults)
+            cache_dir: Folder for the transcript/entity cache (None disables caching)
+            cache_max_bytes: Size budget of the cache before least recently used entries are evicted
+            registry: Model registry to load models through (a private one is created if omitted)
+            detection_mode: How the rule tier and the ML model combine (model, rules or hybrid)
+            llm_contexts: Llama contexts in the Unsloth pool (chunks of long transcripts run in parallel)
+            ner_backend: DeBERTa runtime (torch, onnx or onnx-int8); ONNX never imports torch
+            onnx_dir: Folder for the one-time ONNX export (defaults to ./onnx_models)
+            model_dir: Folder of pre-downloaded models (see download_models.py), used before the hub
+            offline: Never contact the Hugging Face hub; models must be in model_dir or the local caches
+            preload: Load the required models now; otherwise models load on first use or via load_in_background
+            whisper_slots: Transcriptions that may run at once (Whisper workers)
+            ner_slots: DeBERTa calls that may run at once (pipeline instances sharing one set of weights)
+            padding: Seconds muted around each entity, or {entity_type: seconds} with an optional "default"
+            bridge_gap: Mute intervals of the same type closer than this many seconds are joined
+            snap_boundaries: Widen mute intervals to the nearest quiet frame of the decoded audio
+            long_file_seconds: Audio at least this long is split at pauses and transcribed in parallel
+                on the Whisper slots (0 disables it)
+            chunk_min_seconds, chunk_max_seconds: Length range of those chunks
+
+        The detector is safe to share between threads: the model is chosen per
+        call, and each model bounds its own concurrency (whisper_slots,
+        ner_slots, llm_contexts) with threads sized so every model's slots
+        together stay within cpu_threads (or the core count).
         """
+        if detection_mode not in DETECTION_MODES:
+            raise ValueError(f"Unsupported detection mode: {detection_mode}")
+        if ner_backend not in NER_BACKENDS:
+            raise ValueError(f"Unsupported NER backend: {ner_backend}")
         self.whisper_model_size = whisper_model_size
         self.compute_type = compute_type
         self.device = device
         self.model_type = model_type
-        self.unsloth_llm = None  # For llama-cpp
-        
+        self.cpu_threads = cpu_threads
+        self.detection_mode = detection_mode
+        self.llm_contexts = llm_contexts
+        self.ner_backend = ner_backend
+        self.onnx_dir = onnx_dir or os.path.join(os.getcwd(), "onnx_models")
+        self.model_dir = model_dir
+        self.offline = offline
+        self.load_error = None
+        self.whisper_slots = whisper_slots
+        self.ner_slots = ner_slots
+        self._whisper_slots = threading.BoundedSemaphore(whisper_slots)
+        self.padding = padding
+        self.bridge_gap = bridge_gap
+        self.snap_boundaries = snap_boundaries
+        self.long_file_seconds = long_file_seconds
+        self.chunk_min_seconds = chunk_min_seconds
+        self.chunk_max_seconds = chunk_max_seconds
+        # Chunks of long files; each still waits for a Whisper slot
+        self._chunk_executor = ThreadPoolExecutor(max_workers=whisper_slots, thread_name_prefix="whisper-chunk")
+        if offline:
+            # Read by huggingface_hub when it is first imported, which the lazy imports defer until now
+            os.environ.setdefault("HF_HUB_OFFLINE", "1")
+            os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+        self.rule_detector = RuleDetector()
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.cache = ResultCache(cache_dir, cache_max_bytes) if cache_dir else None
+
         # Initialize models
-        self._initialize_models()
-        
-        # For lazy loading Whisper
-        self._whisper_model = None
+        self.registry = registry or ModelRegistry()
+        self._initialize_models(preload)
 
-    def _initialize_models(self):
-        """Initialize both models with proper configuration."""
-        print(f"Initializing {self.model_type} model...")
-        
-        # Initialize DeBERTa
-        self.deberta_tokenizer = AutoTokenizer.from_pretrained("AI-Enthusiast11/pii-entity-extractor")
-        self.deberta_model = AutoModelForTokenClassification.from_pretrained("AI-Enthusiast11/pii-entity-extractor")
-        self.deberta_nlp = pipeline(
-            "ner",
-            model=self.deberta_model,
-            tokenizer=self.deberta_tokenizer,
-            aggregation_strategy="simple",
-            device=self.device
+    def _initialize_models(self, preload: bool = True):
+        """Register every model with the registry and, with `preload`, load the required ones.
+
+        Each builder imports its own backend (faster_whisper, transformers,
+        onnxruntime, llama_cpp), so importing this module loads none of them.
+        """
+
+        self.registry.register("whisper", self._build_whisper_model, warmup=self._warm_up_whisper)
+        self.registry.register("deberta", self._build_deberta, warmup=lambda deberta: deberta["nlp"]("warm up"))
+        # The 7B LLM is the first thing to go when memory is tight or it sits idle
+        self.registry.register("unsloth", self._build_unsloth_model, evictable=True,
+                               warmup=lambda llm: llm.warm_up())
+
+        if preload:
+            for name in self.required_models():
+                print(f"Initializing {name} model...")
+                self.registry.get(name)
+
+    def _threads(self, slots: int) -> int:
+        """CPU threads for each of a model's `slots`.
+
+        Whisper and the detector run at the same time (in the staged pipeline
+        or across requests), so cpu_threads (or every core) is split across
+        the required models first and then across each model's slots.
+        """
+        return threads_per_slot(slots, self.cpu_threads, len(self.required_models()))
+
+    def local_model_path(self, name: str) -> Optional[str]:
+        """`name` inside model_dir if it was pre-downloaded there."""
+        if not self.model_dir:
+            return None
+        path = os.path.join(self.model_dir, name)
+        return path if os.path.exists(path) else None
+
+    def _build_deberta(self) -> Dict:
+        source = self.local_model_path(DEBERTA_MODEL_ID.replace("/", "--")) or DEBERTA_MODEL_ID
+        if self.ner_backend != "torch":
+            from onnx_ner import load_classifier
+            classifier = load_classifier(DEBERTA_MODEL_ID, self.onnx_dir, self.ner_backend,
+                                         self._threads(self.ner_slots), source=source)
+            # The classifier also covers the tokenizer and model roles; ONNX Runtime
+            # sessions are thread-safe, so every slot shares the one instance
+            return {"tokenizer": classifier, "model": classifier, "nlp": classifier,
+                    "pool": ModelPool([classifier] * self.ner_slots)}
+
+        import torch
+        from transformers import pipeline, AutoTokenizer, AutoModelForTokenClassification
+        if self._threads(self.ner_slots):
+            torch.set_num_threads(self._threads(self.ner_slots))
+        tokenizer = AutoTokenizer.from_pretrained(source, local_files_only=self.offline)
+        model = AutoModelForTokenClassification.from_pretrained(source, local_files_only=self.offline)
+        # One pipeline per slot, all on the same weights; each gets its own copy
+        # of the tokenizer, since a fast tokenizer cannot be used by two threads at once
+        pipelines = [
+            pipeline(
+                "ner",
+                model=model,
+                tokenizer=tokenizer if slot == 0 else copy.deepcopy(tokenizer),
+                aggregation_strategy="simple",
+                device=self.device
+            )
+            for slot in range(self.ner_slots)
+        ]
+        return {"tokenizer": tokenizer, "model": model, "nlp": pipelines[0], "pool": ModelPool(pipelines)}
+
+    def _build_unsloth_model(self) -> "LlmDetector":
+        from llama_cpp import Llama
+        from llm_detector import LlmDetector
+
+        local_path = self.local_model_path(UNSLOTH_FILENAME)
+        if local_path:
+            loader = lambda **options: Llama(model_path=local_path, verbose=False, **options)
+        else:
+            loader = lambda **options: Llama.from_pretrained(
+                repo_id=UNSLOTH_REPO_ID,
+                filename=UNSLOTH_FILENAME,
+                verbose=False,
+                **options
+            )
+        return LlmDetector(loader, contexts=self.llm_contexts,
+                           threads=self._threads(self.llm_contexts))
+
+    def _build_whisper_model(self):
+        from faster_whisper import WhisperModel
+
+        local_path = self.local_model_path(f"faster-whisper-{self.whisper_model_size}")
+        return WhisperModel(
+            local_path or self.whisper_model_size,
+            device=self.device,
+            compute_type=self.compute_type,
+            cpu_threads=self._threads(self.whisper_slots),
+            num_workers=self.whisper_slots,
+            download_root=os.path.join(os.getcwd(), "whisper_models"),
+            local_files_only=self.offline
         )
-        
-        # Initialize Unsloth (lazy loading)
-        self.unsloth_model = None
-        self.unsloth_initialized = False
+
+    @staticmethod
+    def _warm_up_whisper(model):
+        # One second of silence is enough to initialize the decoder kernels
+        segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32))
+        list(segments)
+
+    @property
+    def deberta_tokenizer(self):
+        return self.registry.get("deberta")["tokenizer"]
+
+    @property
+    def deberta_model(self):
+        return self.registry.get("deberta")["model"]
+
+    @property
+    def deberta_nlp(self):
+        return self.registry.get("deberta")["nlp"]
+
+    @property
+    def unsloth_llm(self):
+        return self.registry.get("unsloth")
 
     def load_unsloth_model(self):
-        if not self.unsloth_llm:
-            print("Loading Unsloth llama-cpp model...")
-            self.unsloth_llm = Llama.from_pretrained(
-                repo_id="AI-Enthusiast11/mistral-7b-4bit-pii-entity-extractor",
-                filename="unsloth.Q4_K_M.gguf"
-            )
+        self.registry.get("unsloth")
 
+    def warm_up(self, models: List[str] = None):
+        """Load models ahead of traffic and run a dummy inference through each."""
+        self.registry.warm_up(models or self.required_models())
+
+    def required_models(self) -> List[str]:
+        """Models the current configuration needs before it can serve a request."""
+        return ["whisper"] if self.detection_mode == "rules" else ["whisper", self.model_type]
+
+    def is_ready(self) -> bool:
+        """Whether every required model is loaded, so no request waits on a model load."""
+        return all(self.registry.is_loaded(name) for name in self.required_models())
+
+    def load_in_background(self, models: List[str] = None) -> threading.Thread:
+        """Load and warm up models on a daemon thread.
+
+        Requests that arrive before it finishes load what they need on first
+        use; the registry makes sure each model is still loaded only once.
+        """
+        def load():
+            try:
+                self.warm_up(models)
+                log_event("models_ready", models=models or self.required_models())
+            except Exception as e:
+                self.load_error = str(e)
+                print(f"Error loading models: {str(e)}")
+
+        thread = threading.Thread(target=load, name="model-loader", daemon=True)
+        thread.start()
+        return thread
 
     def set_model(self, model_type: str):
-        """Switch between DeBERTa and Unsloth models."""
-        if model_type not in ['deberta', 'unsloth']:
+        """Switch the default model between DeBERTa and Unsloth.
+
+        This changes the detector for every caller; code sharing a detector
+        across threads should pass `model_type` to each call instead.
+        """
+        if model_type not in DETECTOR_MODELS:
             raise ValueError(f"Unsupported model type: {model_type}")
         
         if model_type == "unsloth":
@@ -77,16 +573,225 @@ class PIIDetector:
         self.model_type = model_type
         print(f"Switched to {model_type} model")
 
-    def detect_entities(self, text: str) -> List[Dict]:
-        """Detect PII entities using the currently active model."""
-        if self.model_type == "deberta":
-            return self._detect_with_deberta(text)
+    def set_detection_mode(self, detection_mode: str):
+        """Choose how the rule tier and the ML model are combined."""
+        if detection_mode not in DETECTION_MODES:
+            raise ValueError(f"Unsupported detection mode: {detection_mode}")
+        self.detection_mode = detection_mode
+
+    def _resolve_model(self, model_type: str = None) -> str:
+        """The model a call runs on: its own `model_type`, or the detector's default."""
+        model_type = model_type or self.model_type
+        if model_type not in DETECTOR_MODELS:
+            raise ValueError(f"Unsupported model type: {model_type}")
+        return model_type
+
+    def detect_entities(self, text: str, use_cache: bool = True, model_type: str = None) -> List[Dict]:
+        """Detect PII entities with `model_type` (the default model if omitted) and the detection mode."""
+        return self.detect_entities_batch([text], use_cache=use_cache, model_type=model_type)[0]
+
+    def _model_revision(self, model_type: str = None) -> str:
+        """Identifies the weights behind a model, so cached entities follow model updates.
+
+        The rule tier has no weights; in rules mode no model is loaded for the key.
+        """
+        if self.detection_mode == "rules":
+            return "rules"
+        if (model_type or self.model_type) == "deberta":
+            commit = getattr(getattr(self.deberta_model, "config", None), "_commit_hash", None)
+            backend = "" if self.ner_backend == "torch" else f"+{self.ner_backend}"
+            return f"{DEBERTA_MODEL_ID}@{commit or 'main'}{backend}"
+        # Grammar-constrained, offset-mapped output differs from the old free-form parse
+        return f"{UNSLOTH_REPO_ID}/{UNSLOTH_FILENAME}+constrained"
+
+    def _entity_cache_key(self, text: str, model_type: str) -> str:
+        if self.cache is None:
+            return None
+        if self.detection_mode == "rules":
+            # Rule results do not depend on the model the call asked for
+            model_type = "rules"
+        return make_key(text=hash_text(text), model_type=model_type,
+                        revision=self._model_revision(model_type), detection_mode=self.detection_mode)
+
+    def _transcript_cache_key(self, audio: AudioInput) -> str:
+        if self.cache is None:
+            return None
+        parts = {}
+        if self.long_file_seconds:
+            # Chunked transcripts can differ slightly from single-pass ones
+            parts["chunking"] = [self.long_file_seconds, self.chunk_min_seconds, self.chunk_max_seconds]
+        return make_key(
+            audio=hash_file(audio) if isinstance(audio, str) else hash_bytes(audio),
+            whisper_model_size=self.whisper_model_size,
+            compute_type=self.compute_type,
+            options=WHISPER_TRANSCRIBE_OPTIONS,
+            **parts
+        )
+
+    def detect_entities_batch(self, texts: List[str], batch_size: int = 8, use_cache: bool = True,
+                              model_type: str = None, return_exceptions: bool = False) -> List[List[Dict]]:
+        """Detect PII entities in many texts, returning one entity list per text.
+
+        With DeBERTa the texts are bucketed by length, so each padded batch holds
+        similarly sized inputs, and the model runs once per bucket. Pass
+        `use_cache=False` for throwaway texts (e.g. live rolling windows). When
+        detection fails for some texts (an LLM chunk error), the first error is
+        raised, or with `return_exceptions` each failed text's entry is its error.
+        """
+        model_type = self._resolve_model(model_type)
+        results = [[] for _ in texts]
+        keys = [self._entity_cache_key(text, model_type) if use_cache else None for text in texts]
+        misses = []
+        for i, text in enumerate(texts):
+            cached = self.cache.get("entities", keys[i]) if keys[i] else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                misses.append(i)
+
+        if self.detection_mode == "rules":
+            with timed(MODEL_SECONDS, model="rules"):
+                found = [self.rule_detector.detect(texts[i]) for i in misses]
+        elif self.detection_mode == "hybrid":
+            found = self._detect_hybrid([texts[i] for i in misses], batch_size, model_type)
         else:
-            return self._detect_with_unsloth(text)
+            found = self._detect_with_model([texts[i] for i in misses], batch_size, model_type)
+
+        for i, entities in zip(misses, found):
+            results[i] = entities
+            if keys[i] and not isinstance(entities, Exception):
+                self.cache.put("entities", keys[i], entities)
+        if not return_exceptions:
+            for entities in results:
+                if isinstance(entities, Exception):
+                    raise entities
+        return results
+
+    def _detect_with_model(self, texts: List[str], batch_size: int = 8, model_type: str = None) -> List[List[Dict]]:
+        """Run an ML model over texts (bucketed batches for DeBERTa).
+
+        DeBERTa texts longer than its input are split into overlapping token
+        windows (see _ner_windows), all bucketed together. An entity belongs to
+        the window it starts in, unless it starts in the part the next window
+        also covers; one overlapping an entity already taken is dropped, so
+        each entity is reported once, with offsets into the whole text.
+        """
+        if (model_type or self.model_type) != "deberta":
+            return self._detect_with_unsloth_batch(texts)
+
+        results = [[] for _ in texts]
+        pool = self.registry.get("deberta")["pool"]
+        # (text index, window start, window end, end of the part this window owns)
+        windows = []
+        with pool.acquire() as nlp:
+            # The ONNX classifier tokenizes itself; a pipeline through its own tokenizer
+            tokenize = nlp.tokenize if hasattr(nlp, "tokenize") else nlp.tokenizer.tokenize
+            for i, text in enumerate(texts):
+                if not text.strip():
+                    continue
+                spans = self._ner_windows(text, tokenize)
+                for n, (start, end) in enumerate(spans):
+                    windows.append((i, start, end, spans[n + 1][0] if n + 1 < len(spans) else len(text)))
+
+        found = [[] for _ in windows]
+        order = sorted(range(len(windows)), key=lambda w: windows[w][2] - windows[w][1])
+        for begin in range(0, len(order), batch_size):
+            bucket = order[begin:begin + batch_size]
+            with pool.acquire() as nlp, timed(MODEL_SECONDS, model="deberta"):
+                raw_batch = nlp([texts[windows[w][0]][windows[w][1]:windows[w][2]] for w in bucket],
+                                batch_size=len(bucket))
+            for w, raw_results in zip(bucket, raw_batch):
+                found[w] = self._merge_deberta_results(raw_results)
+
+        claimed = [0] * len(texts)
+        for (i, start, _, owned_until), entities in zip(windows, found):
+            for entity in entities:
+                entity = dict(entity, start=entity['start'] + start, end=entity['end'] + start)
+                if entity['start'] >= owned_until or entity['start'] < claimed[i]:
+                    continue
+                claimed[i] = max(claimed[i], entity['end'])
+                results[i].append(entity)
+        return results
 
-    def _detect_with_deberta(self, text: str) -> List[Dict]:
-        """DeBERTa specific entity detection."""
-        raw_results = self.deberta_nlp(text)
+    @staticmethod
+    def _ner_windows(text: str, tokenize, window_tokens: int = NER_WINDOW_TOKENS,
+                     overlap_tokens: int = NER_OVERLAP_TOKENS) -> List[Tuple[int, int]]:
+        """(start, end) character spans of at most `window_tokens` tokens covering `text`.
+
+        Windows end at word boundaries, and each one starts about
+        `overlap_tokens` before the previous one ended, so an entity cut by one
+        window is seen whole by the next. A text that fits is a single window.
+        """
+        # A token covers at least one character, so short texts need no tokenizing
+        if len(text) <= window_tokens or len(tokenize(text)) <= window_tokens:
+            return [(0, len(text))]
+        words = [m.span() for m in re.finditer(r"\S+", text)]
+        costs = [len(tokenize(" " + text[start:end])) for start, end in words]
+
+        windows = []
+        first = 0
+        while first < len(words):
+            last, used = first, costs[first]
+            while last + 1 < len(words) and used + costs[last + 1] <= window_tokens:
+                last += 1
+                used += costs[last]
+            windows.append((words[first][0], words[last][1]))
+            if last + 1 >= len(words):
+                break
+            following, tail = last + 1, 0
+            while following > first + 1 and tail < overlap_tokens:
+                following -= 1
+                tail += costs[following]
+            first = following
+        return windows
+
+    def _detect_hybrid(self, texts: List[str], batch_size: int = 8, model_type: str = None) -> List[List[Dict]]:
+        """Rules first; the ML model only sees the parts of each text that still need it.
+
+        Those are sentences with numbers the rules could not type, or with cues
+        for unstructured PII such as names and addresses. Model entities of
+        structured types are dropped where the rules already found one.
+        """
+        results = []
+        chunks = []
+        owners = []
+        with timed(MODEL_SECONDS, model="rules"):
+            for i, text in enumerate(texts):
+                entities, unresolved = self.rule_detector.scan(text)
+                results.append(entities)
+                for start, end in self.rule_detector.model_spans(text, unresolved):
+                    chunks.append(text[start:end])
+                    owners.append((i, start))
+
+        failures = {}
+        for (i, offset), found in zip(owners, self._detect_with_model(chunks, batch_size, model_type)):
+            if isinstance(found, Exception):
+                failures.setdefault(i, found)
+                continue
+            ruled = results[i]
+            ruled_values = {normalize_value(entity['word']) for entity in ruled}
+            for entity in found:
+                entity = dict(entity)
+                if "start" in entity:
+                    entity['start'] += offset
+                    entity['end'] += offset
+                if entity['entity_type'] in STRUCTURED_TYPES:
+                    if "start" in entity:
+                        overlaps = any(entity['start'] < other['end'] and other['start'] < entity['end']
+                                       for other in ruled if "start" in other)
+                    else:
+                        overlaps = normalize_value(entity['word']) in ruled_values
+                    if overlaps:
+                        continue
+                results[i].append(entity)
+
+        for entities in results:
+            entities.sort(key=lambda entity: entity.get('start', -1))
+        return [failures.get(i, entities) for i, entities in enumerate(results)]
+
+    @staticmethod
+    def _merge_deberta_results(raw_results: List[Dict]) -> List[Dict]:
+        """Merge adjacent DeBERTa token groups of the same type into entities."""
         merged_entities = []
         
         if not raw_results:
@@ -133,101 +838,158 @@ class PIIDetector:
         })
 
         return merged_entities
-    def redact_text(self, text, entities):
-        if not entities:
-            return text
-
-        # If using Unsloth (no 'start'), do replacement by value
-        if "start" not in entities[0]:
-            redacted_text = text
-            for entity in sorted(entities, key=lambda e: -len(e["word"])):
-                pattern = re.escape(entity["word"])
-                redacted_text = re.sub(pattern, f"[{entity['entity_type']}]", redacted_text, flags=re.IGNORECASE)
-            return redacted_text
-
-        # If using DeBERTa (has start/end)
-        entities = sorted(entities, key=lambda x: x["start"], reverse=True)
-        text_chars = list(text)
-        for entity in entities:
-            text_chars[entity["start"]:entity["end"]] = list(f"[{entity['entity_type']}]")
-        return "".join(text_chars)
-  
+    def redact_text(self, text, entities, style: str = "tag", hash_key: bytes = None):
+        """Replace entities in `text` (offset entities by position, value-only ones
+        wherever the value occurs) with `style` placeholders; see TextRedactor.
+        Pass `hash_key` to keep hashes comparable across calls."""
+        return TextRedactor(style, hash_key=hash_key).redact(text, entities)
+
+    def redact_texts(self, texts: List[str], entities: List[List[Dict]] = None, style: str = "tag",
+                     model_type: str = None, hash_key: bytes = None, batch_size: int = 8) -> List[Dict]:
+        """Redact many documents, e.g. transcripts from another ASR system.
+
+        Without `entities`, detection runs first (batched, with `model_type`
+        and the detection mode). One redactor serves the whole call, so a value
+        gets the same pseudonym in every document; pass `hash_key` to keep
+        hashes comparable across calls. Returns {"redacted_text", "entities"}
+        per document.
+        """
+        if entities is None:
+            entities = self.detect_entities_batch(texts, batch_size, model_type=model_type)
+        redactor = TextRedactor(style, hash_key=hash_key)
+        with timed(stage="redact_text"):
+            redacted = redactor.redact_batch(texts, entities)
+        return [{"redacted_text": text, "entities": text_entities}
+                for text, text_entities in zip(redacted, entities)]
 
     def _detect_with_unsloth(self, text: str) -> List[Dict]:
-        """Unsloth LLM detection with basic label: value output."""
-        if not self.unsloth_initialized:
-            self.load_unsloth_model()
+        """Unsloth LLM detection (see _detect_with_unsloth_batch); raises if it failed."""
+        found = self._detect_with_unsloth_batch([text])[0]
+        if isinstance(found, Exception):
+            raise found
+        return found
+
+    def _detect_with_unsloth_batch(self, texts: List[str]) -> List[List[Dict]]:
+        """Unsloth LLM detection: chunked over the context pool, grammar-constrained
+        "LABEL: value" output, entities mapped back to character offsets.
+
+        A text whose detection failed gets the exception in place of its entity
+        list, so it is reported as an error rather than passed on unredacted.
+        """
+        try:
+            with timed(MODEL_SECONDS, model="unsloth"):
+                found = self.unsloth_llm.detect_batch(texts, return_exceptions=True)
+        except Exception as e:
+            # Nothing ran, e.g. the model failed to load
+            found = [e] * len(texts)
+        for result in found:
+            if isinstance(result, Exception):
+                log_event("detection_failed", level=logging.ERROR, model="unsloth",
+                          error=f"{type(result).__name__}: {result}")
+        return found
 
-        pii_prompt = """Extract the personally identifiable information (PII) from the following text. 
-        Only return entities in this format: <LABEL>: <ENTITY>
 
-        Example:
-        Input: "hi, i am lucas clark. i recently made a payment of $1,500 on my loan, but the payment hasn't been reflected. my credit card number is 4111 1111 1111 1111."
-        Response:
-        NAME: lucas clark
-        CREDIT-CARD-NO: 4111 1111 1111 1111
-        ###
+    def _load_whisper_model(self):
+        """Return the shared Whisper model instance."""
+        return self.registry.get("whisper")
+
+    def iter_transcription(self, audio: AudioInput) -> Iterator[Dict]:
+        """Yield words with timestamps as faster-whisper decodes the audio (a path or a decoded buffer).
 
-        Input:"{}"
-        Response:
+        Decoding happens while the words are consumed, so the Whisper slot is
+        held until the generator is exhausted or closed.
         """
+        model = self._load_whisper_model()
+        with self._whisper_slots:
+            segments, _ = model.transcribe(audio, **WHISPER_TRANSCRIBE_OPTIONS)
 
-        try:
+            for segment in segments:
+                for word_info in segment.words:
+                    yield {
+                        'text': word_info.word.strip(),
+                        'start': word_info.start,
+                        'end': word_info.end
+                    }
 
-            prompt = pii_prompt.format(text,"")  #
-            output = self.unsloth_llm(
-                prompt,
-                max_tokens=2048,
-                temperature=0.0,
-                stop=["###"]
-            )
+    def transcribe_audio(self, audio: AudioInput) -> List[Dict]:
+        """Transcribe audio (a path or a buffer from decode_audio) with word-level timestamps.
 
-            result_text = output["choices"][0]["text"].strip()
-            entities = []
+        Results are cached by audio content and Whisper settings, so the same
+        recording is not transcribed again when switching detectors. Audio of
+        at least `long_file_seconds` is transcribed in parallel chunks (see
+        transcribe_chunked).
+        """
+        key = self._transcript_cache_key(audio)
+        if key:
+            cached = self.cache.get("transcripts", key)
+            if cached is not None:
+                return cached
 
-            for line in result_text.splitlines():
-                if ": " in line:
-                    label, word = line.split(": ", 1)
-                    entities.append({
-                        "entity_type": label.strip(),
-                        "word": word.strip(),
-                    })
+        samples = self._long_file_samples(audio)
+        if samples is not None:
+            transcription = self.transcribe_chunked(samples)
+        else:
+            transcription = list(self.iter_transcription(audio))
+        if key:
+            self.cache.put("transcripts", key, transcription)
+        return transcription
 
-            return entities
+    def _long_file_samples(self, audio: AudioInput) -> Optional[np.ndarray]:
+        """The decoded samples of `audio` if long-file mode applies to it, else None."""
+        if not self.long_file_seconds:
+            return None
+        if isinstance(audio, str):
+            try:
+                if sf.info(audio).duration < self.long_file_seconds:
+                    return None
+            except RuntimeError:
+                pass  # not a libsndfile format; decode and measure below
+            audio = decode_audio(audio)
+        return audio if len(audio) >= self.long_file_seconds * SAMPLE_RATE else None
 
-        except Exception as e:
-            print("Error in Unsloth detection:", e)
-            return []
+    def transcribe_chunked(self, samples: np.ndarray) -> List[Dict]:
+        """Transcribe a long 16 kHz buffer as parallel chunks split at pauses.
 
+        Each chunk is decoded with some audio of its neighbours for context,
+        and word times are shifted back onto the whole file. A word is kept by
+        the chunk its midpoint falls in; near a cut both chunks may report it,
+        and the second copy is dropped. The output has the same form as
+        iter_transcription's. With N Whisper slots a long file takes about
+        1/N of the single-pass time.
+        """
+        chunks = split_on_silence(samples, SAMPLE_RATE, self.chunk_min_seconds, self.chunk_max_seconds)
+        overlap = int(CHUNK_OVERLAP_SECONDS * SAMPLE_RATE)
 
-    @lru_cache(maxsize=1)
-    def _load_whisper_model(self):
-        """Cache and return Whisper model instance."""
-        return WhisperModel(
-            self.whisper_model_size,
-            device=self.device,
-            compute_type=self.compute_type,
-            download_root=os.path.join(os.getcwd(), "whisper_models")
-        )
+        def transcribe(index: int) -> List[Dict]:
+            start, end = chunks[index]
+            begin = max(start - overlap, 0)
+            offset = begin / SAMPLE_RATE
+            # The first chunk owns everything before its end; later ones also
+            # claim words just before their start, in case the timing shifted
+            low = start / SAMPLE_RATE - (EDGE_TOLERANCE_SECONDS if index else math.inf)
+            high = end / SAMPLE_RATE if index < len(chunks) - 1 else math.inf
+            words = []
+            for word in self.iter_transcription(samples[begin:min(end + overlap, len(samples))]):
+                word = dict(word, start=word['start'] + offset, end=word['end'] + offset)
+                if low <= (word['start'] + word['end']) / 2 < high:
+                    words.append(word)
+            return words
 
-    def transcribe_audio(self, audio_path: str) -> List[Dict]:
-        """Transcribe audio with word-level timestamps."""
-        model = self._load_whisper_model()
-        segments, _ = model.transcribe(
-            audio_path,
-            word_timestamps=True,
-            vad_filter=True
-        )
+        with timed(stage="transcribe_chunks"):
+            transcribed = list(self._chunk_executor.map(transcribe, range(len(chunks))))
 
-        transcription = []
-        for segment in segments:
-            for word_info in segment.words:
-                transcription.append({
-                    'text': word_info.word.strip(),
-                    'start': word_info.start,
-                    'end': word_info.end
-                })
-        return transcription
+        stitched = []
+        for words in transcribed:
+            edge = stitched[-1]['end'] if stitched else -math.inf
+            recent = {normalize_value(word['text']) for word in stitched[-3:]}
+            for word in words:
+                # Same word, overlapping the previous chunk's last words: a duplicate from the cut
+                if word['start'] < edge and normalize_value(word['text']) in recent:
+                    continue
+                stitched.append(word)
+        log_event("transcribed_chunks", chunks=len(chunks), words=len(stitched),
+                  audio_seconds=round(len(samples) / SAMPLE_RATE, 3))
+        return stitched
 
     @staticmethod
     def clean_transcription(text: str) -> str:
@@ -236,79 +998,431 @@ class PIIDetector:
         text = text.replace("- ", "-")  # Remove space after hyphen
         return text
 
-    def match_pii_to_segments(self, pii_entities: List[Dict], transcription: List[Dict]) -> List[Dict]:
-        """Match PII entities to audio segments."""
-        pii_words = [val.lower() for entity in pii_entities for val in [entity['word']]]
-        redaction_segments = []
-
-        for word_info in transcription:
-            clean_text = word_info['text'].replace(",", "").replace(".", "").replace("-", "").lower()
-            for pii_entity in pii_entities:
-                pii_value = pii_entity['word'].replace("-", "").replace(" ", "").lower()
-                if clean_text in pii_value:
-                    redaction_segments.append({
-                        "start": word_info['start'],
-                        "end": word_info['end'],
-                        "entity_type": pii_entity['entity_type']
-                    })
-        return redaction_segments
-
-    def redact_audio(self, input_path: str, output_path: str, segments_to_mute: List[Dict], padding: float = 0.1):
-        """Redact sensitive audio segments."""
-        input_audio = ffmpeg.input(input_path)
-        audio = input_audio.audio
-        filtered_audio = audio
-
-        for segment in segments_to_mute:
-            start = max(segment['start'] - padding, 0)
-            end = segment['end'] + padding
-            filtered_audio = filtered_audio.filter_("volume", enable=f"between(t,{start},{end})", volume=0)
-
-        out = ffmpeg.output(filtered_audio, output_path)
-        ffmpeg.run(out, overwrite_output=True)
-
-    def detect_and_redact_audio(self, audio_path: str, output_path: str = None) -> Dict:
+    def match_pii_to_segments(self, pii_entities: List[Dict], transcription: List[Dict],
+                              aligner: WordAligner = None) -> List[Dict]:
+        """Match PII entities to audio segments.
+
+        Offset-based entities (DeBERTa) are mapped to words by binary search over
+        the character index; value-only entities (Unsloth) are located with a
+        single Aho-Corasick pass. Each word is returned at most once.
+        """
+        if aligner is None:
+            aligner = WordAligner(transcription)
+        return aligner.align(pii_entities)
+
+    def redact_audio(self, audio: AudioInput, output_path: str, segments_to_mute: List[Dict],
+                     padding: Padding = DEFAULT_PADDING, fill: str = "silence", gap: float = 0.0,
+                     snap: bool = False) -> Dict[str, List[Tuple[float, float]]]:
+        """Redact sensitive audio segments in a single pass over the decoded samples.
+
+        Segments are padded (per entity type if `padding` is a dict) and merged
+        into one interval list per type, bridging gaps up to `gap` seconds; with
+        `snap` the edges move out to the nearest quiet frame. The cost depends
+        on the file length plus the number of merged intervals. `fill` is
+        either "silence" (zero the samples) or "beep" (replace them with a
+        tone). A buffer from decode_audio is redacted in place and encoded once,
+        as 16-bit PCM. Returns the muted intervals per entity type.
+        """
+        if fill not in ("silence", "beep"):
+            raise ValueError(f"Unsupported fill: {fill}")
+
+        if isinstance(audio, str):
+            with sf.SoundFile(audio) as source:
+                sample_rate = source.samplerate
+                subtype = source.subtype
+                samples = source.read(dtype="float32", always_2d=True)
+        else:
+            sample_rate = SAMPLE_RATE
+            subtype = "PCM_16"
+            samples = audio.reshape(-1, 1)
+
+        by_type = intervals_by_type(segments_to_mute, padding, gap)
+        if snap:
+            # Edges are snapped on the first channel, which is all a decoded buffer has
+            by_type = {entity_type: snap_intervals(intervals, samples[:, 0], sample_rate)
+                       for entity_type, intervals in by_type.items()}
+        apply_intervals(samples, flatten_intervals(by_type), sample_rate, fill=fill)
+        sf.write(output_path, samples, sample_rate, subtype=_output_subtype(output_path, subtype))
+        return by_type
+
+    def redact_audio_stream(self, audio: AudioInput, output_path: str, batches: Iterable[Dict],
+                            padding: Padding = None, fill: str = "silence", gap: float = None,
+                            snap: bool = None) -> Iterator[Dict]:
+        """Write redacted audio while detection batches are still arriving.
+
+        Each batch from `stream_detect` carries its new segments and a
+        `committed_until` time; audio before that point, less what a later
+        interval could still reach back over (see hold_back_seconds), can no
+        longer change, so it is written immediately. Batches are passed through
+        to the caller. `audio` is a path or a buffer from decode_audio (written
+        as 16-bit PCM). `padding`, `gap` and `snap` default to the detector's
+        settings, as in the batch path (see redact_audio and mute_intervals).
+        """
+        if fill not in ("silence", "beep"):
+            raise ValueError(f"Unsupported fill: {fill}")
+        padding = self.padding if padding is None else padding
+        gap = self.bridge_gap if gap is None else gap
+        snap = self.snap_boundaries if snap is None else snap
+        hold_back = hold_back_seconds(padding, gap, snap)
+
+        with open_audio(audio) as (sample_rate, channels, frames, subtype, read), \
+                sf.SoundFile(output_path, "w", samplerate=sample_rate, channels=channels,
+                             subtype=_output_subtype(output_path, subtype)) as sink:
+            pending = []
+            written = 0
+
+            def flush(until: int):
+                nonlocal pending, written
+                until = min(until, frames)
+                if until <= written:
+                    return
+                by_type = mute_intervals(pending, padding, gap, snap, read, frames, sample_rate)
+                block = read(written, until)
+                apply_intervals(block, flatten_intervals(by_type), sample_rate, offset=written, fill=fill)
+                sink.write(block)
+                written = until
+                # Segments that can no longer reach this far can be dropped
+                pending = [s for s in pending if (s['end'] + hold_back) * sample_rate > until]
+
+            for batch in batches:
+                pending.extend(batch['segments'])
+                committed = batch['committed_until'] - hold_back
+                if committed != math.inf:
+                    flush(max(int(committed * sample_rate), 0))
+                yield batch
+
+            flush(frames)
+
+    def detect_and_redact_audio(self, audio_path: AudioInput, output_path: str = None, model_type: str = None) -> Dict:
         """Complete audio processing pipeline."""
-        # 1. Transcribe audio
-        transcription = self.transcribe_audio(audio_path)
-        
-        # 2. Join all words for detection
-        full_text = " ".join([w["text"] for w in transcription])
-        
-        # 3. Clean transcription
-        clean_text = self.clean_transcription(full_text)
-        print(f"[DEBUG] Cleaned transcription: {clean_text}")
-        
-        # 4. Detect PII
-        pii_entities = self.detect_entities(clean_text)
-        
-        # 5. Match PII to timestamps
-        segments_to_mute = self.match_pii_to_segments(pii_entities, transcription)
-        
-        # 6. Redact audio
+        return self.detect_and_redact_audio_batch([audio_path], [output_path], model_type=model_type)[0]
+
+    def detect_and_redact_audio_batch(self, audio_paths: List[AudioInput], output_paths: List[str] = None,
+                                      batch_size: int = 8, model_type: str = None) -> List[Dict]:
+        """Audio pipeline for several files: transcribe all, detect in batches, then redact each.
+
+        Inputs are paths or buffers from decode_audio; buffers need an output path.
+        """
+        if output_paths is None:
+            output_paths = [None] * len(audio_paths)
+        jobs = [{"audio_path": audio, "output_path": output_path, "model_type": model_type}
+                if isinstance(audio, str) else
+                {"audio": audio, "name": Path(output_path or "").name, "output_path": output_path,
+                 "model_type": model_type}
+                for audio, output_path in zip(audio_paths, output_paths)]
+
+        # 1-3. Transcribe audio and join words for detection
+        jobs = [self._transcribe_stage(job) for job in jobs]
+
+        # 4. Detect PII across all transcripts at once, in batches
+        detected = []
+        for begin in range(0, len(jobs), batch_size):
+            detected.extend(self._detect_stage(jobs[begin:begin + batch_size]))
+
+        for job in detected:
+            if isinstance(job, Exception):
+                raise job
+
+        # 5-6. Match PII to timestamps and redact audio
+        return [self._redact_stage(job) for job in detected]
+
+    def build_pipeline(self, transcribe_workers: int = 1, detect_workers: int = 1,
+                       redact_workers: int = 2, queue_size: int = 4, batch_size: int = 8) -> StagedPipeline:
+        """Staged pipeline that overlaps transcription, detection and redaction across files.
+
+        Submit {"audio_path", "output_path"} payloads, or {"audio", "name",
+        "output_path"} with a buffer from decode_audio, plus an optional
+        "model_type" (the default model otherwise); each stage has its own
+        thread pool and bounded input queue, and detection batches whatever
+        transcripts are waiting (up to `batch_size`). Use `stats()` on the
+        returned pipeline to see per-stage queue depth and utilization.
+        """
+        return StagedPipeline([
+            PipelineStage("transcribe", self._transcribe_stage, transcribe_workers),
+            PipelineStage("detect", self._detect_stage, detect_workers, batch_size=batch_size),
+            PipelineStage("redact", self._redact_stage, redact_workers)
+        ], queue_size=queue_size)
+
+    @staticmethod
+    def _job_audio(job: Dict) -> AudioInput:
+        """Pipeline payloads carry either a decoded buffer ("audio") or a file ("audio_path")."""
+        return job['audio'] if 'audio' in job else job['audio_path']
+
+    @staticmethod
+    def _job_name(job: Dict) -> str:
+        return job.get('name') or Path(job['audio_path']).name
+
+    def _transcribe_stage(self, job: Dict) -> Dict:
+        """Transcribe one file, keeping each word's character offsets.
+
+        The aligner applies clean_transcription's rules while joining the words.
+        """
+        started = time.perf_counter()
+        audio = self._job_audio(job)
+        with timed(stage="transcribe"):
+            aligner = WordAligner(self.transcribe_audio(audio))
+        audio_seconds = sf.info(audio).duration if isinstance(audio, str) else len(audio) / SAMPLE_RATE
+        WORDS.inc(len(aligner.words))
+        AUDIO_DURATION.observe(audio_seconds)
+        # Only sizes are logged here; the transcript is logged after redaction
+        log_event("transcribed", file=self._job_name(job), words=len(aligner.words),
+                  characters=len(aligner.text), audio_seconds=round(audio_seconds, 3),
+                  seconds=round(time.perf_counter() - started, 3))
+        return dict(job, aligner=aligner, started=started)
+
+    def _detect_stage(self, jobs: List[Dict]) -> List[Dict]:
+        """Detect PII in a batch of transcribed files, each with its payload's "model_type"."""
+        by_model = {}
+        for i, job in enumerate(jobs):
+            by_model.setdefault(self._resolve_model(job.get('model_type')), []).append(i)
+        all_entities = [None] * len(jobs)
+        with timed(stage="detect"):
+            for model_type, indices in by_model.items():
+                found = self.detect_entities_batch([jobs[i]['aligner'].text for i in indices], len(indices),
+                                                   model_type=model_type, return_exceptions=True)
+                for i, entities in zip(indices, found):
+                    all_entities[i] = entities
+
+        # A file whose detection failed fails on its own (see PipelineStage)
+        outputs = []
+        for job, pii_entities in zip(jobs, all_entities):
+            if isinstance(pii_entities, Exception):
+                outputs.append(pii_entities)
+                continue
+            for entity_type, count in entity_type_counts(pii_entities).items():
+                ENTITIES.inc(count, entity_type=entity_type)
+            outputs.append(dict(job, pii_entities=pii_entities))
+        return outputs
+
+    def _redact_stage(self, job: Dict) -> Dict:
+        """Match PII to timestamps and redact one file."""
+        aligner = job['aligner']
+        pii_entities = job['pii_entities']
+        with timed(stage="match"):
+            segments_to_mute = self.match_pii_to_segments(pii_entities, aligner.words, aligner)
+
+        output_path = job.get('output_path')
         if output_path is None:
+            if 'audio' in job:
+                raise ValueError("output_path is required for in-memory audio")
+            audio_path = job['audio_path']
             output_path = str(Path(audio_path).with_name(f"redacted_{Path(audio_path).name}"))
-        
-        self.redact_audio(audio_path, output_path, segments_to_mute)
-        
+
+        with timed(stage="redact"):
+            by_type = self.redact_audio(self._job_audio(job), output_path, segments_to_mute,
+                                        padding=self.padding, gap=self.bridge_gap, snap=self.snap_boundaries)
+
+        FILES.inc()
+        SEGMENTS.inc(len(segments_to_mute))
+        if 'started' in job:
+            FILE_SECONDS.observe(time.perf_counter() - job['started'])
+        log_event("redacted", file=self._job_name(job), model=self._resolve_model(job.get('model_type')),
+                  detection_mode=self.detection_mode, entities=entity_type_counts(pii_entities),
+                  muted_segments=len(segments_to_mute),
+                  muted_intervals=sum(len(intervals) for intervals in by_type.values()))
+        if logger.isEnabledFor(logging.DEBUG):
+            log_event("redacted_transcript", level=logging.DEBUG, file=self._job_name(job),
+                      transcript=self.redact_text(aligner.text, pii_entities))
+
+        return {
+            "redacted_audio_path": output_path,
+            "transcription": aligner.text,
+            "pii_entities": pii_entities,
+            "redacted_segments": segments_to_mute,
+            "redacted_intervals": compact_intervals(by_type)
+        }
+
+    def _count_tokens(self, text: str, model_type: str = None) -> int:
+        """Number of detector tokens `text` occupies."""
+        if self.detection_mode == "rules" or self._resolve_model(model_type) != "deberta":
+            # The rule tier has no input limit and the LLM chunks its own input; counting
+            # words keeps windows similar without loading DeBERTa
+            return max(len(text.split()), 1)
+        return len(self.deberta_tokenizer.tokenize(text))
+
+    def stream_detect(self, words: Iterable[Dict], window_tokens: int = 384,
+                      overlap_tokens: int = 64, model_type: str = None) -> Iterator[Dict]:
+        """Detect PII over overlapping token windows of a (lazy) word stream.
+
+        Keeps the detector under its maximum sequence length on long recordings.
+        Entities starting in a window's overlap tail are left to the next window,
+        and anything already claimed by an earlier window is skipped, so each
+        entity is reported once. Yields batches of the form
+        {"entities", "segments", "committed_until"}, where no later batch will
+        add segments before `committed_until` (in seconds).
+        """
+        buffer = []
+        buffered_tokens = 0
+        base = 0
+        claimed_until = 0
+        pos = 0
+        previous = None
+
+        def process(final: bool) -> Dict:
+            nonlocal buffer, buffered_tokens, base, claimed_until
+            if final:
+                commit = len(buffer)
+            else:
+                # Keep roughly `overlap_tokens` worth of trailing words for the next window
+                commit, tail = len(buffer), 0
+                while commit > 1 and tail < overlap_tokens:
+                    commit -= 1
+                    tail += buffer[commit]['tokens']
+
+            window = [entry['word'] for entry in buffer]
+            aligner = WordAligner(window)
+            accepted = []
+            for first, last, entity in aligner.entity_ranges(self.detect_entities(aligner.text, model_type=model_type)):
+                if first >= commit or base + first < claimed_until:
+                    continue
+                claimed_until = max(claimed_until, base + last)
+                if "start" in entity:
+                    # Re-anchor window offsets onto the full transcript
+                    entity = dict(entity)
+                    entity['start'] = buffer[first]['char_start'] + entity['start'] - aligner.starts[first]
+                    entity['end'] = buffer[last - 1]['char_end'] + entity['end'] - aligner.ends[last - 1]
+                accepted.append((first, last, entity))
+
+            segments = aligner.segments_for(accepted)
+            watermark = max(base + commit, claimed_until) - base
+            if final:
+                committed_until = math.inf
+            elif watermark < len(buffer):
+                committed_until = buffer[watermark]['word']['start']
+            else:
+                committed_until = buffer[-1]['word']['end']
+
+            buffer = buffer[commit:]
+            buffered_tokens = sum(entry['tokens'] for entry in buffer)
+            base += commit
+            return {
+                "entities": [entity for _, _, entity in accepted],
+                "segments": segments,
+                "committed_until": committed_until
+            }
+
+        for word in words:
+            separator = word_separator(previous, word['text'])
+            pos += len(separator)
+            buffer.append({
+                'word': word,
+                'tokens': self._count_tokens(separator + word['text'], model_type),
+                'char_start': pos,
+                'char_end': pos + len(word['text'])
+            })
+            pos += len(word['text'])
+            previous = word['text']
+            buffered_tokens += buffer[-1]['tokens']
+            if buffered_tokens >= window_tokens:
+                yield process(final=False)
+
+        yield process(final=True)
+
+    def detect_and_redact_audio_streaming(self, audio_path: AudioInput, output_path: str = None,
+                                          padding: Padding = None, model_type: str = None) -> Dict:
+        """Streaming variant of detect_and_redact_audio for long recordings.
+
+        Transcription, windowed detection and audio writing run as one generator
+        chain, so redacted audio is written while Whisper is still decoding.
+        Like detect_and_redact_audio it takes a path or a decoded buffer (which
+        needs an output path), and mutes with the detector's padding (unless
+        `padding` is given), bridge gap and boundary snapping.
+        """
+        padding = self.padding if padding is None else padding
+        if output_path is None:
+            if not isinstance(audio_path, str):
+                raise ValueError("output_path is required for in-memory audio")
+            output_path = str(Path(audio_path).with_name(f"redacted_{Path(audio_path).name}"))
+
+        texts = []
+
+        def words():
+            for word in self.iter_transcription(audio_path):
+                texts.append(word['text'])
+                yield word
+
+        pii_entities = []
+        segments_to_mute = []
+        batches = self.stream_detect(words(), model_type=model_type)
+        for batch in self.redact_audio_stream(audio_path, output_path, batches, padding=padding):
+            pii_entities.extend(batch['entities'])
+            segments_to_mute.extend(batch['segments'])
+
+        previous = None
+        pieces = []
+        for text in texts:
+            pieces.append(word_separator(previous, text) + text)
+            previous = text
+
         return {
             "redacted_audio_path": output_path,
-            "transcription": clean_text,
+            "transcription": "".join(pieces),
             "pii_entities": pii_entities,
-            "redacted_segments": segments_to_mute
+            "redacted_segments": segments_to_mute,
+            "redacted_intervals": compact_intervals(self._stream_intervals(audio_path, segments_to_mute, padding))
         }
 
-    def batch_redact_audio(self, input_folder: str, output_folder: str) -> List[Dict]:
-        """Process multiple audio files."""
+    def _stream_intervals(self, audio: AudioInput, segments: List[Dict], padding: Padding):
+        """The per-type intervals redact_audio_stream muted for `segments`."""
+        with open_audio(audio) as (sample_rate, _, frames, _, read):
+            return mute_intervals(segments, padding, self.bridge_gap, self.snap_boundaries,
+                                  read, frames, sample_rate)
+
+    def batch_redact_audio(self, input_folder: str, output_folder: str, batch_size: int = 8,
+                           workers: int = 1, ordered: bool = True, manifest_path: str = None) -> List[Dict]:
+        """Process multiple audio files through the staged pipeline (see build_pipeline).
+
+        With `workers` > 1 the files are spread over a process pool instead (see
+        batch_processing.parallel_redact), where a failing file produces an
+        {"input_path", "error"} record rather than aborting the batch.
+        """
+        if workers > 1 or manifest_path:
+            from batch_processing import parallel_redact
+            return list(parallel_redact(
+                sorted(Path(input_folder).glob("*.wav")), output_folder,
+                detector_config=self.config(), workers=workers,
+                ordered=ordered, manifest_path=manifest_path
+            ))
+
         os.makedirs(output_folder, exist_ok=True)
         audio_files = list(Path(input_folder).glob("*.wav"))
+        jobs = [{"audio_path": str(audio_file), "output_path": str(Path(output_folder) / audio_file.name)}
+                for audio_file in audio_files]
 
+        # Transcription of the next files overlaps detection/redaction of earlier ones
         results = []
-        for audio_file in audio_files:
-            print(f"Processing: {audio_file.name}")
-            output_path = Path(output_folder) / audio_file.name
-            result = self.detect_and_redact_audio(str(audio_file), str(output_path))
-            results.append(result)
-            print(f"Redacted file saved to: {output_path}\n")
+        with self.build_pipeline(batch_size=batch_size) as pipeline:
+            for job, result, error in pipeline.map(jobs):
+                print(f"Processed: {Path(job['audio_path']).name}")
+                if error:
+                    raise error
+                results.append(result)
+                print(f"Redacted file saved to: {job['output_path']}\n")
         
-        return results
\ No newline at end of file
+        return results
+
+    def config(self) -> Dict:
+        """Constructor arguments needed to build an equivalent detector (e.g. in a worker process)."""
+        return {
+            "whisper_model_size": self.whisper_model_size,
+            "compute_type": self.compute_type,
+            "device": self.device,
+            "model_type": self.model_type,
+            "cpu_threads": self.cpu_threads,
+            "cache_dir": self.cache_dir,
+            "cache_max_bytes": self.cache_max_bytes,
+            "detection_mode": self.detection_mode,
+            "llm_contexts": self.llm_contexts,
+            "ner_backend": self.ner_backend,
+            "onnx_dir": self.onnx_dir,
+            "model_dir": self.model_dir,
+            "offline": self.offline,
+            "whisper_slots": self.whisper_slots,
+            "ner_slots": self.ner_slots,
+            "padding": self.padding,
+            "bridge_gap": self.bridge_gap,
+            "snap_boundaries": self.snap_boundaries,
+            "long_file_seconds": self.long_file_seconds,
+            "chunk_min_seconds": self.chunk_min_seconds,
+            "chunk_max_seconds": self.chunk_max_seconds
+        }
@@ -0,0 +1,197 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+
+# Tells a stage worker to exit
+_STOP = object()
+
+
+class PipelineStage:
+    """One step of a StagedPipeline, served by its own pool of worker threads.
+
+    `func` takes a payload and returns the payload for the next stage. With
+    `batch_size` > 1 it instead takes a list of payloads (whatever is already
+    queued, up to `batch_size`) and returns a list of the same length, where
+    an exception in place of an output fails only that payload.
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int = 1, batch_size: int = 1):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue = None
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self.errors = 0
+        self.active = 0
+        self.stopped = 0
+        self.lock = threading.Lock()
+
+
+class StagedPipeline:
+    """Run payloads through a chain of stages connected by bounded queues.
+
+    Every stage has its own workers, so different items occupy different stages
+    at the same time (e.g. transcribing file N+1 while redacting file N). A full
+    queue blocks the stage feeding it, which keeps memory bounded.
+    """
+
+    def __init__(self, stages: List[PipelineStage], queue_size: int = 4):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.started_at = None
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def start(self) -> "StagedPipeline":
+        with self._start_lock:
+            if self.started_at is None:
+                self._start_workers()
+        return self
+
+    def _start_workers(self):
+        self.started_at = time.perf_counter()
+        for stage in self.stages:
+            stage.queue = queue.Queue(maxsize=self.queue_size)
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(index,),
+                                          name=f"{stage.name}-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers once everything already submitted has been processed."""
+        if self.started_at is None:
+            return
+        for _ in range(self.stages[0].workers):
+            self.stages[0].queue.put(_STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def submit(self, payload: Any) -> Future:
+        """Queue a payload; blocks while the first stage's queue is full."""
+        self.start()
+        future = Future()
+        self.stages[0].queue.put((payload, future))
+        return future
+
+    def map(self, payloads: Iterable[Any]) -> Iterator[Tuple[Any, Any, Exception]]:
+        """Run payloads through the pipeline, yielding (payload, result, error) in input order."""
+        pending = queue.Queue()
+
+        def feed():
+            for payload in payloads:
+                pending.put((payload, self.submit(payload)))
+            pending.put(_STOP)
+
+        threading.Thread(target=feed, name="pipeline-feeder", daemon=True).start()
+        while True:
+            item = pending.get()
+            if item is _STOP:
+                return
+            payload, future = item
+            error = future.exception()
+            yield payload, (None if error else future.result()), error
+
+    def _take(self, stage: PipelineStage) -> List:
+        """Block for one item, then grab whatever else is queued up to the batch size."""
+        items = [stage.queue.get()]
+        while len(items) < stage.batch_size and items[-1] is not _STOP:
+            try:
+                items.append(stage.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    @staticmethod
+    def _run(stage: PipelineStage, payloads: List) -> List[Tuple[Any, Exception]]:
+        """(output, error) per payload.
+
+        A batch that raises is retried one payload at a time, so a bad payload
+        fails only its own future rather than every payload batched with it
+        (which may belong to other callers).
+        """
+        try:
+            if stage.batch_size > 1:
+                return [(None, output) if isinstance(output, Exception) else (output, None)
+                        for output in stage.func(payloads)]
+            return [(stage.func(payloads[0]), None)]
+        except Exception as e:
+            if len(payloads) == 1:
+                return [(None, e)]
+        outcomes = []
+        for payload in payloads:
+            try:
+                output = stage.func([payload])[0]
+                outcomes.append((None, output) if isinstance(output, Exception) else (output, None))
+            except Exception as e:
+                outcomes.append((None, e))
+        return outcomes
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            items = self._take(stage)
+            stop = items[-1] is _STOP
+            jobs = [item for item in items if item is not _STOP]
+
+            if jobs:
+                with stage.lock:
+                    stage.active += 1
+                started = time.perf_counter()
+                outcomes = self._run(stage, [payload for payload, _ in jobs])
+                elapsed = time.perf_counter() - started
+                with stage.lock:
+                    stage.active -= 1
+                    stage.busy_seconds += elapsed
+                    stage.processed += len(jobs)
+                    stage.errors += sum(1 for _, failure in outcomes if failure)
+
+                for (_, future), (output, failure) in zip(jobs, outcomes):
+                    if failure:
+                        future.set_exception(failure)
+                    elif downstream:
+                        downstream.queue.put((output, future))
+                    else:
+                        future.set_result(output)
+
+            if stop:
+                with stage.lock:
+                    stage.stopped += 1
+                    last = stage.stopped == stage.workers
+                if last and downstream:
+                    for _ in range(downstream.workers):
+                        downstream.queue.put(_STOP)
+                return
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-stage queue depth, activity and utilization, for tuning pool sizes."""
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        report = {}
+        for stage in self.stages:
+            capacity = elapsed * stage.workers
+            report[stage.name] = {
+                "workers": stage.workers,
+                "queue_depth": stage.queue.qsize() if stage.queue else 0,
+                "queue_capacity": self.queue_size,
+                "active": stage.active,
+                "processed": stage.processed,
+                "errors": stage.errors,
+                "busy_seconds": round(stage.busy_seconds, 3),
+                "utilization": round(stage.busy_seconds / capacity, 3) if capacity else 0.0
+            }
+        return report
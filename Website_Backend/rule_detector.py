@@ -0,0 +1,233 @@
+import re
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+
+
+SPOKEN_DIGITS = {
+    "zero": "0", "oh": "0", "o": "0", "one": "1", "two": "2", "three": "3", "four": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9"
+}
+SPOKEN_REPEATS = {"double": 2, "triple": 3}
+
+# Spoken digit sequences shorter than this are left as words ("no one", "oh, two")
+MIN_SPOKEN_DIGITS = 3
+
+# Digit runs shorter than this are never treated as structured PII (amounts, zip codes...)
+MIN_CANDIDATE_DIGITS = 7
+
+# How far back (in characters) a keyword may sit from the number it describes
+CONTEXT_WINDOW = 60
+
+CONTEXT_KEYWORDS = {
+    "SSN": ["social security", "ssn", "social"],
+    "BANK-ROUTING-NO": ["routing", "aba", "transit"],
+    "BANK-ACCOUNT-NO": ["account", "acct"],
+    "CREDIT-CARD-NO": ["card", "visa", "mastercard", "amex", "credit"],
+    "PHONE-NO": ["phone", "call", "reach", "contact", "cell", "mobile", "text me"]
+}
+
+# Types this tier can settle on its own; NAME and ADDRESS are left to the models
+STRUCTURED_TYPES = frozenset(CONTEXT_KEYWORDS)
+
+# Cues for unstructured PII (names, addresses) that only the ML model can type
+_MODEL_CUES = re.compile(
+    r"\b(?:name|this is|i am|i'm|mr|mrs|ms|address|live|living|located|street|st|avenue|ave|road|rd|"
+    r"drive|lane|ln|boulevard|blvd|court|way|apt|apartment|suite|\d{5})\b"
+)
+_SENTENCE = re.compile(r"[^.!?]+[.!?]*")
+_DIGIT_RUN = re.compile(r"(?<![A-Za-z0-9])\d(?:[ .\-]{0,3}\d)*(?![A-Za-z0-9])")
+_WORD = re.compile(r"[A-Za-z]+")
+_SPOKEN_GAP = re.compile(r"[\s,\-]*")
+_SSN_SHAPE = re.compile(r"^\d{3}-\d{2}-\d{4}$")
+_PHONE_SHAPE = re.compile(r"^(?:\+?1[ .\-]?)?\(?\d{3}\)?[ .\-]\d{3}[ .\-]\d{4}$")
+_KEYWORDS = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(k) for ks in CONTEXT_KEYWORDS.values() for k in ks),
+                             key=len, reverse=True)) + r")\b"
+)
+_KEYWORD_TYPES = {k: entity_type for entity_type, ks in CONTEXT_KEYWORDS.items() for k in ks}
+
+
+def luhn_valid(digits: str) -> bool:
+    """Luhn checksum used by payment card numbers."""
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        value = int(ch)
+        if i % 2:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return total % 10 == 0
+
+
+def aba_valid(digits: str) -> bool:
+    """ABA checksum used by US bank routing numbers."""
+    if len(digits) != 9:
+        return False
+    weights = (3, 7, 1) * 3
+    return sum(int(ch) * w for ch, w in zip(digits, weights)) % 10 == 0
+
+
+def ssn_valid(digits: str) -> bool:
+    """SSA format rules: nine digits, no all-zero groups, area not 000 or 666."""
+    return (len(digits) == 9 and digits[:3] not in ("000", "666")
+            and digits[3:5] != "00" and digits[5:] != "0000")
+
+
+def normalize_spoken_digits(text: str) -> Tuple[str, List[int], List[int]]:
+    """Rewrite spoken digit sequences ("four one one one") as digits.
+
+    Returns the normalized text and, for each of its characters, the start and
+    end offsets of the original text it came from, so matches can be mapped back.
+    """
+    pieces = []
+    starts = []
+    ends = []
+    pos = 0
+
+    def keep(until: int):
+        nonlocal pos
+        pieces.append(text[pos:until])
+        starts.extend(range(pos, until))
+        ends.extend(range(pos + 1, until + 1))
+        pos = until
+
+    words = list(_WORD.finditer(text))
+    i = 0
+    while i < len(words):
+        # Collect a run of digit words separated only by spaces, commas or hyphens
+        run = []
+        j = i
+        while j < len(words):
+            token = words[j].group().lower()
+            if run and _SPOKEN_GAP.fullmatch(text[words[j - 1].end():words[j].start()]) is None:
+                break
+            if token in SPOKEN_DIGITS:
+                run.append((words[j], SPOKEN_DIGITS[token]))
+                j += 1
+            elif (token in SPOKEN_REPEATS and j + 1 < len(words)
+                  and words[j + 1].group().lower() in SPOKEN_DIGITS
+                  and _SPOKEN_GAP.fullmatch(text[words[j].end():words[j + 1].start()])):
+                digit = SPOKEN_DIGITS[words[j + 1].group().lower()]
+                run.append((words[j], None))
+                run.append((words[j + 1], digit * SPOKEN_REPEATS[token]))
+                j += 2
+            else:
+                break
+
+        if sum(len(digit or "") for _, digit in run) < MIN_SPOKEN_DIGITS:
+            i = max(j, i + 1)
+            continue
+
+        keep(run[0][0].start())
+        for n, (match, digit) in enumerate(run):
+            if digit is None:
+                continue
+            if n and pieces[-1] and pieces[-1][-1].isdigit():
+                pieces.append(" ")
+                starts.append(match.start())
+                ends.append(match.start())
+            # "double five" maps both digits back to the whole phrase
+            origin = run[n - 1][0].start() if n and run[n - 1][1] is None else match.start()
+            pieces.append(digit)
+            starts.extend([origin] * len(digit))
+            ends.extend([match.end()] * len(digit))
+        pos = run[-1][0].end()
+        i = j
+
+    keep(len(text))
+    return "".join(pieces), starts, ends
+
+
+class RuleDetector:
+    """Deterministic detector for structured PII (SSNs, phone, card and bank numbers).
+
+    Numbers are found with precompiled patterns (after spoken-digit
+    normalization), then typed by the nearest preceding keyword and checked
+    against the format/checksum rules of that type. Entities use the same
+    entity_type/start/end/word/score shape as the DeBERTa detector.
+    """
+
+    def detect(self, text: str) -> List[Dict]:
+        entities, _ = self.scan(text)
+        return entities
+
+    def scan(self, text: str) -> Tuple[List[Dict], List[Tuple[int, int]]]:
+        """Return (entities, unresolved) where `unresolved` are (start, end) spans of
+        long numbers the rules could not type confidently."""
+        normalized, starts, ends = normalize_spoken_digits(text)
+        lowered = text.lower()
+        keywords = [(m.end(), _KEYWORD_TYPES[m.group()]) for m in _KEYWORDS.finditer(lowered)]
+        keyword_ends = [end for end, _ in keywords]
+
+        entities = []
+        unresolved = []
+        for match in _DIGIT_RUN.finditer(normalized):
+            digits = re.sub(r"\D", "", match.group())
+            if len(digits) < MIN_CANDIDATE_DIGITS:
+                continue
+
+            start = starts[match.start()]
+            end = ends[match.end() - 1]
+            k = bisect_right(keyword_ends, start) - 1
+            context = keywords[k][1] if k >= 0 and start - keyword_ends[k] <= CONTEXT_WINDOW else None
+
+            typed = self._classify(match.group(), digits, context)
+            if typed is None:
+                unresolved.append((start, end))
+                continue
+            entity_type, score = typed
+            entities.append({
+                "entity_type": entity_type,
+                "start": start,
+                "end": end,
+                "word": text[start:end],
+                "score": score
+            })
+        return entities, unresolved
+
+    @staticmethod
+    def model_spans(text: str, unresolved: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Spans of `text` that still need the ML model: sentences holding an
+        unresolved number or a name/address cue, with neighbours merged."""
+        lowered = text.lower()
+        spans = []
+        for sentence in _SENTENCE.finditer(lowered):
+            start, end = sentence.span()
+            needed = (any(s < end and start < e for s, e in unresolved)
+                      or _MODEL_CUES.search(lowered, start, end) is not None)
+            if not needed:
+                continue
+            if spans and spans[-1][1] == start:
+                spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+        return spans
+
+    @staticmethod
+    def _classify(raw: str, digits: str, context: str):
+        """Pick (entity_type, score) for a number, or None when it stays ambiguous."""
+        n = len(digits)
+        fits = {
+            "SSN": ssn_valid(digits),
+            "PHONE-NO": n == 10 or (n == 11 and digits[0] == "1"),
+            "CREDIT-CARD-NO": 13 <= n <= 19,
+            "BANK-ROUTING-NO": n == 9,
+            "BANK-ACCOUNT-NO": 6 <= n <= 17
+        }
+        checksum = {
+            "CREDIT-CARD-NO": luhn_valid(digits),
+            "BANK-ROUTING-NO": aba_valid(digits)
+        }
+
+        if context and fits[context]:
+            return context, 0.99 if checksum.get(context) else 0.9
+
+        # No usable keyword: only accept unambiguous shapes or valid checksums
+        if _SSN_SHAPE.match(raw) and fits["SSN"]:
+            return "SSN", 0.8
+        if _PHONE_SHAPE.match(raw):
+            return "PHONE-NO", 0.8
+        if fits["CREDIT-CARD-NO"] and checksum["CREDIT-CARD-NO"]:
+            return "CREDIT-CARD-NO", 0.85
+        return None
@@ -0,0 +1,114 @@
+import os
+import re
+import hmac
+import hashlib
+import threading
+from typing import Dict, List, Tuple
+
+from alignment import normalize_value
+
+
+# mask: "**** ****"; tag: "[NAME]"; pseudonym: "NAME_1" (same value, same pseudonym);
+# hash: "[NAME:3f1c2a9b04de]" (keyed, so short values like SSNs cannot be brute-forced back)
+REDACTION_STYLES = ("mask", "tag", "pseudonym", "hash")
+
+HASH_DIGITS = 12
+
+# Separators a value-only entity may be written or transcribed with ("john smith", "JOHN-SMITH")
+_SEPARATORS = re.compile(r"[\s,.\-_]+")
+
+
+class TextRedactor:
+    """Replaces entities in text in one linear pass per document.
+
+    Offset entities (DeBERTa, rule tier) are used as given. Value-only
+    entities (Unsloth) are compiled into a single case-insensitive
+    alternation and found with one scan, on whole-word boundaries and with
+    any run of separators between their tokens. Overlapping spans are merged and
+    the output is built with one join. Pseudonyms are numbered per entity
+    type and stay the same for a value across every document this redactor
+    handles; values are compared without case or separators.
+    """
+
+    def __init__(self, style: str = "tag", hash_key: bytes = None, mask_char: str = "*"):
+        if style not in REDACTION_STYLES:
+            raise ValueError(f"Unsupported redaction style: {style}")
+        self.style = style
+        self.mask_char = mask_char
+        # Without a key, hashes are only consistent within this redactor
+        self.hash_key = hash_key or os.urandom(32)
+        self._pseudonyms = {}
+        self._counters = {}          # entity_type -> pseudonyms handed out so far
+        self._lock = threading.Lock()
+
+    def replacement(self, entity_type: str, value: str) -> str:
+        if self.style == "tag":
+            return f"[{entity_type}]"
+        if self.style == "mask":
+            # Keep separators and spacing so the shape of the text survives
+            return "".join(self.mask_char if ch.isalnum() else ch for ch in value)
+        if self.style == "hash":
+            digest = hmac.new(self.hash_key, f"{entity_type}:{normalize_value(value)}".encode("utf-8"),
+                              hashlib.sha256).hexdigest()
+            return f"[{entity_type}:{digest[:HASH_DIGITS]}]"
+        key = (entity_type, normalize_value(value))
+        with self._lock:
+            if key not in self._pseudonyms:
+                number = self._counters[entity_type] = self._counters.get(entity_type, 0) + 1
+                self._pseudonyms[key] = f"{entity_type}_{number}"
+            return self._pseudonyms[key]
+
+    @staticmethod
+    def spans(text: str, entities: List[Dict]) -> List[Tuple[int, int, str]]:
+        """(start, end, entity_type) of every entity occurrence in `text`, unsorted."""
+        spans = []
+        values = {}
+        for entity in entities:
+            if "start" in entity and "end" in entity:
+                spans.append((entity['start'], entity['end'], entity['entity_type']))
+            else:
+                tokens = tuple(token for token in _SEPARATORS.split(entity.get('word', "").lower()) if token)
+                if tokens:
+                    values.setdefault(tokens, entity['entity_type'])
+
+        if values:
+            # Longest values first, so the alternation prefers "john smith" over "john";
+            # the lookarounds keep "ann" out of "annual" and "4111" out of "14111"
+            alternation = "|".join(_SEPARATORS.pattern.join(re.escape(token) for token in tokens)
+                                   for tokens in sorted(values, key=lambda t: len("".join(t)), reverse=True))
+            pattern = re.compile(rf"(?<![^\W_])(?:{alternation})(?![^\W_])", re.IGNORECASE)
+            for match in pattern.finditer(text):
+                entity_type = values.get(tuple(token for token in _SEPARATORS.split(match.group(0).lower())
+                                               if token))
+                if entity_type is None:
+                    # Case folding changed the value (rare Unicode); fall back to the first value's type
+                    entity_type = next(iter(values.values()))
+                spans.append((match.start(), match.end(), entity_type))
+        return spans
+
+    def redact(self, text: str, entities: List[Dict]) -> str:
+        if not entities:
+            return text
+
+        merged = []
+        for start, end, entity_type in sorted(self.spans(text, entities), key=lambda s: (s[0], -s[1])):
+            start, end = max(start, 0), min(end, len(text))
+            if start >= end:
+                continue
+            if merged and start < merged[-1][1]:
+                # Overlapping spans become one, labelled by the one that starts first
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end, entity_type])
+
+        pieces = []
+        pos = 0
+        for start, end, entity_type in merged:
+            pieces.append(text[pos:start])
+            pieces.append(self.replacement(entity_type, text[start:end]))
+            pos = end
+        pieces.append(text[pos:])
+        return "".join(pieces)
+
+    def redact_batch(self, texts: List[str], entities: List[List[Dict]]) -> List[str]:
+        return [self.redact(text, text_entities) for text, text_entities in zip(texts, entities)]